@@ -17,15 +17,21 @@ from starlette.types import Scope
 from starlette.responses import Response
 import socketio
 from services.websocket_state import sio
+from utils.logging_config import start_queue_logging, stop_queue_logging
+from tools.strands_image_generators import warm_up_providers, close_background_clients
 
 root_dir = os.path.dirname(__file__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # onstartup
+    start_queue_logging()
     await agent.initialize()
+    await warm_up_providers()
     yield
     # onshutdown
+    await close_background_clients()
+    stop_queue_logging()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -5,6 +5,7 @@ import time
 import urllib.error
 import urllib.parse
 import uuid
+import weakref
 from datetime import timedelta
 import asyncio
 
@@ -15,12 +16,35 @@ from rich import print as pprint
 from rich.progress import BarColumn, Column, Progress, Table, TimeElapsedColumn
 
 from services.websocket_service import send_to_websocket
+from utils.json_utils import loads as json_loads, dumps as json_dumps
+
+# httpx 的连接池绑定在创建它的事件循环上，所以每个事件循环保留一个长连接客户端，
+# 健康检查和提交工作流复用同一条 keep-alive 连接，而不是每次请求都重新建立 TCP 连接。
+# 客户端需要在事件循环结束前用 close_client() 关闭：图像工具的常驻循环在应用关闭时关闭，
+# 在其他（短生命周期的）事件循环上调用 execute 的代码需要自己调用 close_client()
+_clients = weakref.WeakKeyDictionary()
+
+
+def _get_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=32))
+    return client
+
+
+async def close_client():
+    """关闭当前事件循环上的长连接客户端（如果有）"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
 
 async def check_comfy_server_running(port, host):
-    async with httpx.AsyncClient(timeout=10) as client:
-        url = f'http://{host}:{port}/api/prompt'
-        response = await client.get(url)
-        return response.status_code == 200
+    url = f'http://{host}:{port}/api/prompt'
+    response = await _get_client().get(url, timeout=10)
+    return response.status_code == 200
 
 async def execute(workflow: dict, host, port, wait=True, verbose=False, local_paths=False, timeout=300, ctx: dict = {}):
     if not await check_comfy_server_running(port, host):
@@ -109,33 +133,41 @@ class WorkflowExecution:
 
     async def queue(self):
         data = {"prompt": self.workflow, "client_id": self.client_id}
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(f"http://{self.host}:{self.port}/prompt", json=data)
-                body = response.json()
-                self.prompt_id = body["prompt_id"]
-            except httpx.HTTPStatusError as e:
-                message = "An unknown error occurred"
-                if e.response.status_code == 500:
-                    message = e.response.text
-                elif e.response.status_code == 400:
-                    body = e.response.json()
-                    if body["node_errors"].keys():
-                        message = json.dumps(body["node_errors"], indent=2)
-
-                self.progress.stop()
-
-                pprint(f"[bold red]Error running workflow\n{message}[/bold red]")
-                await send_to_websocket(self.ctx.get('session_id'), {
-                    'type': 'error',
-                    'error': message
-                })
-                raise Exception(message)
+        client = _get_client()
+        try:
+            response = await client.post(
+                f"http://{self.host}:{self.port}/prompt",
+                content=json_dumps(data),
+                headers={"Content-Type": "application/json"},
+            )
+            body = response.json()
+            self.prompt_id = body["prompt_id"]
+        except httpx.HTTPStatusError as e:
+            message = "An unknown error occurred"
+            if e.response.status_code == 500:
+                message = e.response.text
+            elif e.response.status_code == 400:
+                body = e.response.json()
+                if body["node_errors"].keys():
+                    message = json.dumps(body["node_errors"], indent=2)
+
+            self.progress.stop()
+
+            pprint(f"[bold red]Error running workflow\n{message}[/bold red]")
+            await send_to_websocket(self.ctx.get('session_id'), {
+                'type': 'error',
+                'error': message
+            })
+            raise Exception(message)
 
     async def watch_execution(self):
         async for message in self.ws:
             if isinstance(message, str):
-                message = json.loads(message)
+                # on_message ignores frames for other prompts (status, other clients' jobs),
+                # so skip parsing them at all
+                if self.prompt_id not in message:
+                    continue
+                message = json_loads(message)
                 if not await self.on_message(message):
                     break
 
@@ -1,6 +1,6 @@
 from fastapi.responses import FileResponse
 from common import DEFAULT_PORT
-from tools.strands_image_generators import generate_file_id
+from tools.strands_image_generators import generate_file_id, IMAGE_EXTENSIONS
 from services.db_service import db_service
 import traceback
 from services.config_service import USER_DATA_DIR, FILES_DIR
@@ -9,6 +9,8 @@ from services.websocket_service import send_to_websocket, broadcast_session_upda
 from PIL import Image
 from io import BytesIO
 import os
+import glob
+import logging
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
 import httpx
 import aiofiles
@@ -16,8 +18,24 @@ from mimetypes import guess_type
 from utils.http_client import HttpClient
 
 router = APIRouter(prefix="/api")
+logger = logging.getLogger(__name__)
 os.makedirs(FILES_DIR, exist_ok=True)
 
+# 常见图片扩展名直接查表，其他类型再交给 guess_type
+IMAGE_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+
+
+def get_mime_type(filename: str):
+    """根据文件名获取 MIME 类型，未知时返回 None"""
+    mime_type = IMAGE_MIME_TYPES.get(os.path.splitext(filename)[1].lower())
+    return mime_type or guess_type(filename)[0]
+
 # 上传图片接口，支持表单提交
 @router.post("/upload_image")
 async def upload_image(file: UploadFile = File(...)):
@@ -34,7 +52,7 @@ async def upload_image(file: UploadFile = File(...)):
         width, height = img.size
 
     # Determine the file extension
-    mime_type, _ = guess_type(filename)
+    mime_type = get_mime_type(filename)
     # default to 'bin' if unknown
     extension = mime_type.split('/')[-1] if mime_type else ''
 
@@ -56,34 +74,42 @@ async def upload_image(file: UploadFile = File(...)):
 # 文件下载接口
 @router.get("/file/{file_id}")
 async def get_file(file_id: str):
+    # 带扩展名的文件名（前端请求的绝大多数情况）直接命中磁盘，
+    # 数据库记录以不带扩展名的ID为键，这种情况查库总是未命中
+    if '.' in file_id:
+        file_path = os.path.join(FILES_DIR, file_id)
+        if os.path.exists(file_path):
+            return FileResponse(file_path)
+
     # 首先尝试从数据库获取文件信息
     try:
         file_record = db_service.get_file(file_id)
         if file_record:
             # 数据库中有记录，使用数据库中的文件路径
             file_path = os.path.join(FILES_DIR, file_record['file_path'])
-            print(f'🦄get_file from database: {file_path}')
+            logger.debug("get_file from database: %s", file_path)
             if os.path.exists(file_path):
                 return FileResponse(file_path)
     except Exception as e:
-        print(f'🦄get_file database error: {e}')
+        logger.warning("get_file database error: %s", e)
 
     # 如果数据库中没有记录，尝试直接查找文件
     # 首先尝试原始文件名
     file_path = os.path.join(FILES_DIR, file_id)
-    print(f'🦄get_file trying direct path: {file_path}')
+    logger.debug("get_file trying direct path: %s", file_path)
     if os.path.exists(file_path):
         return FileResponse(file_path)
 
-    # 如果没有扩展名，尝试常见的图像扩展名
+    # 如果没有扩展名，一次目录扫描找出 file_id.* ，按常见图像扩展名优先级选取
     if '.' not in file_id:
-        for ext in ['png', 'jpg', 'jpeg', 'gif', 'webp']:
-            file_path_with_ext = os.path.join(FILES_DIR, f'{file_id}.{ext}')
-            print(f'🦄get_file trying with extension: {file_path_with_ext}')
-            if os.path.exists(file_path_with_ext):
-                return FileResponse(file_path_with_ext)
-
-    print(f'🦄get_file not found: {file_id}')
+        candidates = glob.glob(os.path.join(glob.escape(FILES_DIR), glob.escape(file_id) + '.*'))
+        by_ext = {os.path.splitext(c)[1][1:]: c for c in candidates}
+        for ext in IMAGE_EXTENSIONS:
+            if ext in by_ext:
+                logger.debug("get_file found with extension: %s", by_ext[ext])
+                return FileResponse(by_ext[ext])
+
+    logger.debug("get_file not found: %s", file_id)
     raise HTTPException(status_code=404, detail="File not found")
 
 
@@ -1,40 +1,60 @@
 # server/routers/video_generators.py
 from nanoid import generate
 from utils.http_client import HttpClient
-import traceback
 
 import aiofiles
 import httpx
+import json
+import logging
 import mimetypes
 import os
 from io import BytesIO
 
-# from pymediainfo import MediaInfo
-
 # services
 from services.config_service import config_service
 from services.config_service import FILES_DIR
 
 import asyncio
+
+logger = logging.getLogger(__name__)
+
+
+async def probe_video(path):
+    """用 ffprobe 子进程读取第一条视频流的宽高和时长，异步等待，不阻塞事件循环"""
+    proc = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'quiet', '-select_streams', 'v:0', '-print_format', 'json',
+        '-show_entries', 'stream=width,height,duration:format=duration', path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    stdout, _ = await proc.communicate()
+    if proc.returncode != 0:
+        raise Exception(f'ffprobe failed with exit code {proc.returncode}')
+    return json.loads(stdout)
+
+
+# 下载视频时每次写入磁盘的块大小
+VIDEO_DOWNLOAD_CHUNK = 64 * 1024
+
+
 async def get_video_info_and_save(url, file_path_without_extension):
-    # Fetch the video asynchronously
+    # 边下载边写入最终文件，内存中只保留一个分块，而不是整个视频
+    video_path = f"{file_path_without_extension}.mp4"
     async with HttpClient.create() as client:
-        response = await client.get(url)
-        video_content = response.content
-
-    # Save to temporary mp4 file first
-    temp_path = f"{file_path_without_extension}.mp4"
-    async with aiofiles.open(temp_path, 'wb') as out_file:
-        await out_file.write(video_content)
-    print('🎥 Video saved to', temp_path)
+        async with client.stream('GET', url) as response:
+            response.raise_for_status()
+            async with aiofiles.open(video_path, 'wb') as out_file:
+                async for chunk in response.aiter_bytes(VIDEO_DOWNLOAD_CHUNK):
+                    await out_file.write(chunk)
+    logger.info("🎥 Video saved to %s", video_path)
 
     try:
-        media_info = MediaInfo.parse(temp_path)
-        for track in media_info.tracks:
-            if track.track_type == "Video":
-                width = track.width
-                height = track.height
-                print(f"Width: {width}, Height: {height}")
+        metadata = await probe_video(video_path)
+        streams = metadata.get('streams')
+        if not streams:
+            raise Exception('No video stream found')
+        width = streams[0].get('width')
+        height = streams[0].get('height')
 
 
         extension = 'mp4'  # 默认使用 mp4，实际情况可以根据 codec_name 灵活判断
@@ -42,11 +62,11 @@ async def get_video_info_and_save(url, file_path_without_extension):
         # Get mime type
         mime_type = mimetypes.types_map.get('.mp4', 'video/mp4')
 
-        print(f'🎥 Video info - width: {width}, height: {height}, mime_type: {mime_type}, extension: {extension}')
+        logger.info("🎥 Video info - width: %s, height: %s, mime_type: %s, extension: %s", width, height, mime_type, extension)
 
         return mime_type, width, height, extension
     except Exception as e:
-        print(f'Error probing video file {temp_path}: {str(e)}')
+        logger.error("Error probing video file %s: %s", video_path, e)
         raise e
 
 async def generate_video_replicate(prompt, model, aspect_ratio):
@@ -77,17 +97,17 @@ async def generate_video_replicate(prompt, model, aspect_ratio):
 
             prediction_id = res.get("id")
             status = res.get("status")
-            print(f'🎥 Initial prediction status: {status}, id: {prediction_id}')
+            logger.info("🎥 Initial prediction status: %s, id: %s", status, prediction_id)
 
             if not prediction_id:
-                print('🎥 Full Replicate response:', res)
+                logger.error("🎥 Full Replicate response: %s", res)
                 raise Exception("Replicate API returned no prediction id")
 
             # Step 2: Polling loop
             polling_url = f"https://api.replicate.com/v1/predictions/{prediction_id}"
 
             while status not in ("succeeded", "failed", "canceled"):
-                print(f'🎥 Polling prediction {prediction_id}, current status: {status} ...')
+                logger.debug("🎥 Polling prediction %s, current status: %s", prediction_id, status)
                 await asyncio.sleep(3)  # Wait 3 seconds between polls
 
                 poll_response = await client.get(polling_url, headers=headers)
@@ -101,7 +121,7 @@ async def generate_video_replicate(prompt, model, aspect_ratio):
                 detail_error = poll_res.get('detail', f'Prediction failed with status: {status}')
                 raise Exception(f'Replicate video generation failed: {detail_error}')
 
-            print(f'🎥 Prediction succeeded, output url: {output}')
+            logger.info("🎥 Prediction succeeded, output url: %s", output)
 
             video_id = 'vi_' + generate(size=8)
 
@@ -112,6 +132,5 @@ async def generate_video_replicate(prompt, model, aspect_ratio):
             return mime_type, width, height, filename
 
     except Exception as e:
-        print('Error generating video with replicate', e)
-        traceback.print_exc()
+        logger.exception("Error generating video with replicate: %s", e)
         raise e
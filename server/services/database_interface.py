@@ -72,6 +72,16 @@ class DatabaseInterface(ABC):
         """Get messages for a chat session"""
         pass
 
+    @abstractmethod
+    def get_last_image_message(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the most recent message of a session that references an /api/file/ image (only its message column)"""
+        pass
+
+    @abstractmethod
+    def get_latest_message_id(self, session_id: str) -> Optional[Any]:
+        """Get the id of the newest message in a session, or None if it has no messages"""
+        pass
+
     # ComfyUI workflow operations
     @abstractmethod
     def create_comfy_workflow(self, name: str, api_json: str, description: str, inputs: str, outputs: str = None):
@@ -1,5 +1,6 @@
 from typing import List, Dict, Any, Optional
 from .unified_db_service import unified_db_service
+from utils import json_utils
 
 class DatabaseService:
     """Legacy database service that delegates to unified database service"""
@@ -30,16 +31,31 @@ class DatabaseService:
 
         messages = []
         for row in messages_data:
-            if row.get('message'):
+            message = row.get('message')
+            # Stored messages are JSON objects, skip anything that cannot be one without a parse attempt
+            if message and message.lstrip().startswith(('{', '[')):
                 try:
-                    import json
-                    msg = json.loads(row['message'])
+                    msg = json_utils.loads(message)
                     messages.append(msg)
                 except:
                     pass
 
         return messages
 
+    def get_last_image_message(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the most recent parsed message that references an image, or None"""
+        row = self.unified_service.get_last_image_message(session_id)
+        if not row or not row.get('message'):
+            return None
+        try:
+            return json_utils.loads(row['message'])
+        except ValueError:
+            return None
+
+    def get_latest_message_id(self, session_id: str) -> Optional[Any]:
+        """Get the id of the newest message in a session, or None"""
+        return self.unified_service.get_latest_message_id(session_id)
+
     def list_sessions(self, canvas_id: str) -> List[Dict[str, Any]]:
         """List all chat sessions"""
         return self.unified_service.list_chat_sessions(canvas_id)
@@ -56,9 +72,8 @@ class DatabaseService:
 
         sessions = self.list_sessions(id)
 
-        import json
         return {
-            'data': json.loads(canvas.get('data', '{}')) if canvas.get('data') else {},
+            'data': json_utils.loads(canvas.get('data', '{}')) if canvas.get('data') else {},
             'name': canvas.get('name', ''),
             'sessions': sessions
         }
@@ -62,6 +62,14 @@ class DynamoDBAdapter(DatabaseInterface):
     def list_messages(self, session_id: str) -> List[Dict[str, Any]]:
         """Get messages for a chat session"""
         return self.dynamodb_service.list_messages(session_id)
+
+    def get_last_image_message(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the most recent message referencing an /api/file/ image"""
+        return self.dynamodb_service.get_last_image_message(session_id)
+
+    def get_latest_message_id(self, session_id: str) -> Optional[str]:
+        """Get the id of the newest message in a session"""
+        return self.dynamodb_service.get_latest_message_id(session_id)
     
     # ComfyUI workflow operations
     def create_comfy_workflow(self, name: str, api_json: str, description: str, inputs: str, outputs: str = None):
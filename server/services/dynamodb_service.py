@@ -3,15 +3,23 @@ import json
 import os
 from datetime import datetime
 from typing import List, Dict, Any, Optional
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import uuid
 
+# HTTP connections kept alive per process; tool calls, routers and the migrator run on many threads
+MAX_POOL_CONNECTIONS = int(os.getenv('DYNAMODB_MAX_POOL_CONNECTIONS', '50'))
+
+
 class DynamoDBService:
     def __init__(self, region_name='us-west-2'):
         """Initialize DynamoDB service"""
         self.region_name = region_name
-        self.dynamodb = boto3.resource('dynamodb', region_name=region_name)
-        self.client = boto3.client('dynamodb', region_name=region_name)
+        config = Config(max_pool_connections=MAX_POOL_CONNECTIONS)
+        self.dynamodb = boto3.resource('dynamodb', region_name=region_name, config=config)
+        # Separate low-level client: the resource's own client auto-serializes attribute values
+        self.client = boto3.client('dynamodb', region_name=region_name, config=config)
+        self._table_cache = {}
         
         # Table names
         self.tables = {
@@ -25,6 +33,13 @@ class DynamoDBService:
         
         self._ensure_tables_exist()
     
+    def _table(self, key: str):
+        """Return the cached Table resource for a table key"""
+        table = self._table_cache.get(key)
+        if table is None:
+            table = self._table_cache[key] = self.dynamodb.Table(self.tables[key])
+        return table
+
     def _ensure_tables_exist(self):
         """Create tables if they don't exist"""
         try:
@@ -201,7 +216,7 @@ class DynamoDBService:
     # Canvas operations
     def create_canvas(self, id: str, name: str):
         """Create a new canvas"""
-        table = self.dynamodb.Table(self.tables['canvases'])
+        table = self._table('canvases')
         timestamp = self._get_current_timestamp()
 
         item = {
@@ -217,7 +232,7 @@ class DynamoDBService:
 
     def list_canvases(self) -> List[Dict[str, Any]]:
         """Get all canvases"""
-        table = self.dynamodb.Table(self.tables['canvases'])
+        table = self._table('canvases')
 
         response = table.scan()
         items = response.get('Items', [])
@@ -229,14 +244,14 @@ class DynamoDBService:
 
     def get_canvas(self, id: str) -> Optional[Dict[str, Any]]:
         """Get canvas by ID"""
-        table = self.dynamodb.Table(self.tables['canvases'])
+        table = self._table('canvases')
 
         response = table.get_item(Key={'id': id})
         return response.get('Item')
 
     def save_canvas_data(self, id: str, data: str, thumbnail: str = None):
         """Save canvas data"""
-        table = self.dynamodb.Table(self.tables['canvases'])
+        table = self._table('canvases')
         timestamp = self._get_current_timestamp()
 
         update_expression = "SET #data = :data, updated_at = :updated_at"
@@ -259,7 +274,7 @@ class DynamoDBService:
 
     def rename_canvas(self, id: str, name: str):
         """Rename canvas"""
-        table = self.dynamodb.Table(self.tables['canvases'])
+        table = self._table('canvases')
         timestamp = self._get_current_timestamp()
 
         table.update_item(
@@ -274,13 +289,13 @@ class DynamoDBService:
 
     def delete_canvas(self, id: str):
         """Delete canvas"""
-        table = self.dynamodb.Table(self.tables['canvases'])
+        table = self._table('canvases')
         table.delete_item(Key={'id': id})
 
     # Chat session operations
     def create_chat_session(self, id: str, model: str, provider: str, canvas_id: str, title: Optional[str] = None):
         """Save a new chat session"""
-        table = self.dynamodb.Table(self.tables['chat_sessions'])
+        table = self._table('chat_sessions')
         timestamp = self._get_current_timestamp()
 
         item = {
@@ -297,7 +312,7 @@ class DynamoDBService:
 
     def list_chat_sessions(self, canvas_id: str) -> List[Dict[str, Any]]:
         """Get chat sessions for a canvas"""
-        table = self.dynamodb.Table(self.tables['chat_sessions'])
+        table = self._table('chat_sessions')
 
         response = table.query(
             IndexName='canvas_id-updated_at-index',
@@ -310,14 +325,14 @@ class DynamoDBService:
 
     def get_chat_session(self, id: str) -> Optional[Dict[str, Any]]:
         """Get chat session by ID"""
-        table = self.dynamodb.Table(self.tables['chat_sessions'])
+        table = self._table('chat_sessions')
 
         response = table.get_item(Key={'id': id})
         return response.get('Item')
 
     def update_chat_session_title(self, id: str, title: str):
         """Update chat session title"""
-        table = self.dynamodb.Table(self.tables['chat_sessions'])
+        table = self._table('chat_sessions')
         timestamp = self._get_current_timestamp()
 
         table.update_item(
@@ -331,13 +346,13 @@ class DynamoDBService:
 
     def delete_chat_session(self, id: str):
         """Delete chat session"""
-        table = self.dynamodb.Table(self.tables['chat_sessions'])
+        table = self._table('chat_sessions')
         table.delete_item(Key={'id': id})
 
     # Chat message operations
     def create_message(self, session_id: str, role: str, message: str):
         """Save a chat message"""
-        table = self.dynamodb.Table(self.tables['chat_messages'])
+        table = self._table('chat_messages')
         timestamp = self._get_current_timestamp()
         # Use timestamp with microseconds as sort key to maintain order
         # Format: YYYYMMDD_HHMMSS_microseconds
@@ -358,7 +373,7 @@ class DynamoDBService:
 
     def list_messages(self, session_id: str) -> List[Dict[str, Any]]:
         """Get messages for a chat session"""
-        table = self.dynamodb.Table(self.tables['chat_messages'])
+        table = self._table('chat_messages')
 
         response = table.query(
             KeyConditionExpression='session_id = :session_id',
@@ -372,10 +387,49 @@ class DynamoDBService:
 
         return items
 
+    def get_last_image_message(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the most recent message referencing an /api/file/im_ image, newest pages first.
+        Video messages (/api/file/vi_...) do not match, so they cannot hide an older image.
+        Only the message attribute is returned, callers just parse its content.
+        """
+        table = self._table('chat_messages')
+        query_kwargs = {
+            'KeyConditionExpression': 'session_id = :session_id',
+            'FilterExpression': 'contains(#message, :file_ref)',
+            'ProjectionExpression': '#message',
+            'ExpressionAttributeNames': {'#message': 'message'},
+            'ExpressionAttributeValues': {':session_id': session_id, ':file_ref': '/api/file/im_'},
+            'ScanIndexForward': False,  # Newest first
+            'Limit': 50,
+        }
+
+        while True:
+            response = table.query(**query_kwargs)
+            items = response.get('Items', [])
+            if items:
+                return items[0]
+            if 'LastEvaluatedKey' not in response:
+                return None
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def get_latest_message_id(self, session_id: str) -> Optional[str]:
+        """Get the sort key of the newest message in a session"""
+        table = self._table('chat_messages')
+        response = table.query(
+            KeyConditionExpression='session_id = :session_id',
+            ExpressionAttributeValues={':session_id': session_id},
+            ProjectionExpression='id',
+            ScanIndexForward=False,  # Newest first
+            Limit=1
+        )
+        items = response.get('Items', [])
+        return items[0]['id'] if items else None
+
     # ComfyUI workflow operations
     def create_comfy_workflow(self, name: str, api_json: str, description: str, inputs: str, outputs: str = None):
         """Create a new comfy workflow"""
-        table = self.dynamodb.Table(self.tables['comfy_workflows'])
+        table = self._table('comfy_workflows')
         timestamp = self._get_current_timestamp()
         workflow_id = str(uuid.uuid4())
 
@@ -394,7 +448,7 @@ class DynamoDBService:
 
     def list_comfy_workflows(self) -> List[Dict[str, Any]]:
         """List all comfy workflows"""
-        table = self.dynamodb.Table(self.tables['comfy_workflows'])
+        table = self._table('comfy_workflows')
 
         response = table.scan()
         items = response.get('Items', [])
@@ -406,20 +460,20 @@ class DynamoDBService:
 
     def get_comfy_workflow(self, id: int) -> Optional[Dict[str, Any]]:
         """Get comfy workflow by ID"""
-        table = self.dynamodb.Table(self.tables['comfy_workflows'])
+        table = self._table('comfy_workflows')
 
         response = table.get_item(Key={'id': str(id)})
         return response.get('Item')
 
     def delete_comfy_workflow(self, id: int):
         """Delete a comfy workflow"""
-        table = self.dynamodb.Table(self.tables['comfy_workflows'])
+        table = self._table('comfy_workflows')
         table.delete_item(Key={'id': str(id)})
 
     # File operations
     def create_file(self, file_id: str, file_path: str, width: int = None, height: int = None):
         """Create a new file record"""
-        table = self.dynamodb.Table(self.tables['files'])
+        table = self._table('files')
         timestamp = self._get_current_timestamp()
 
         item = {
@@ -438,14 +492,14 @@ class DynamoDBService:
 
     def get_file(self, file_id: str) -> Optional[Dict[str, Any]]:
         """Get file record by ID"""
-        table = self.dynamodb.Table(self.tables['files'])
+        table = self._table('files')
 
         response = table.get_item(Key={'id': file_id})
         return response.get('Item')
 
     def list_files(self) -> List[Dict[str, Any]]:
         """List all files"""
-        table = self.dynamodb.Table(self.tables['files'])
+        table = self._table('files')
 
         response = table.scan()
         items = response.get('Items', [])
@@ -457,13 +511,13 @@ class DynamoDBService:
 
     def delete_file(self, file_id: str):
         """Delete a file record"""
-        table = self.dynamodb.Table(self.tables['files'])
+        table = self._table('files')
         table.delete_item(Key={'id': file_id})
 
     # Database version operations
     def get_db_version(self) -> int:
         """Get current database version"""
-        table = self.dynamodb.Table(self.tables['db_version'])
+        table = self._table('db_version')
 
         response = table.scan()
         items = response.get('Items', [])
@@ -476,6 +530,6 @@ class DynamoDBService:
 
     def set_db_version(self, version: int):
         """Set database version"""
-        table = self.dynamodb.Table(self.tables['db_version'])
+        table = self._table('db_version')
 
         table.put_item(Item={'version': version})
@@ -7,6 +7,7 @@ from services.migrations.v1_initial_schema import V1InitialSchema
 from services.migrations.v2_add_canvases import V2AddCanvases
 from services.migrations.v3_add_comfy_workflow import V3AddComfyWorkflow
 from services.migrations.v4_add_files import V4AddFiles
+from services.migrations.v5_add_image_message_index import V5AddImageMessageIndex
 from . import Migration
 
 ALL_MIGRATIONS = [
@@ -26,6 +27,10 @@ ALL_MIGRATIONS = [
         'version': 4,
         'migration': V4AddFiles,
     },
+    {
+        'version': 5,
+        'migration': V5AddImageMessageIndex,
+    },
 ]
 class MigrationManager:
     def get_migrations_to_apply(self, current_version: int, target_version: int) -> List[Type[Migration]]:
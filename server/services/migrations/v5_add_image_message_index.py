@@ -0,0 +1,22 @@
+from . import Migration
+import sqlite3
+
+
+class V5AddImageMessageIndex(Migration):
+    version = 5
+    description = "Add partial index on messages referencing images"
+
+    def up(self, conn: sqlite3.Connection) -> None:
+        # Only messages that reference an /api/file/im_ image are indexed, so looking up the
+        # latest image of a session no longer walks every message of the session.
+        # The WHERE clause must match the one in SQLiteAdapter.get_last_image_message.
+        # Only SQLite deployments benefit: the server currently runs on DynamoDB, where
+        # SQLite databases are just sources for tools/migrate_to_dynamodb.py.
+        conn.execute(r"""
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_image_refs
+            ON chat_messages(session_id, id)
+            WHERE message LIKE '%/api/file/im\_%' ESCAPE '\'
+        """)
+
+    def down(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DROP INDEX IF EXISTS idx_chat_messages_image_refs")
@@ -1,13 +1,22 @@
 import sqlite3
 import aiosqlite
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterator
 from .database_interface import DatabaseInterface
 from .config_service import USER_DATA_DIR
 from .migrations.manager import MigrationManager
 import os
+from pathlib import Path
 
 # Database version
-CURRENT_VERSION = 4
+CURRENT_VERSION = 5
+
+# Tuning for read-only bulk scans (migration): 512 MB page cache, 1 GB mmap, in-memory temp tables
+READER_PRAGMAS = (
+    "PRAGMA cache_size=-524288",
+    "PRAGMA mmap_size=1073741824",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA query_only=ON",
+)
 
 class SQLiteAdapter(DatabaseInterface):
     """SQLite adapter implementing the database interface"""
@@ -21,6 +30,20 @@ class SQLiteAdapter(DatabaseInterface):
         self._migration_manager = MigrationManager()
         self._init_db()
     
+    @classmethod
+    def open_readonly(cls, db_path: str = None) -> 'SQLiteAdapter':
+        """
+        Open an existing database as a read-only source (used by the DynamoDB migration tool).
+        Unlike the constructor it never creates the file or its directory and never runs schema migrations.
+        """
+        db_path = os.path.abspath(db_path or os.path.join(USER_DATA_DIR, "localmanus.db"))
+        if not os.path.isfile(db_path):
+            raise FileNotFoundError(f"SQLite database not found: {db_path}")
+        adapter = cls.__new__(cls)
+        adapter.db_path = db_path
+        adapter._migration_manager = None
+        return adapter
+
     def _ensure_db_directory(self):
         """Ensure the database directory exists"""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -179,6 +202,30 @@ class SQLiteAdapter(DatabaseInterface):
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
 
+    async def get_last_image_message(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the most recent message referencing an /api/file/im_ image (video messages use vi_ ids and are skipped)"""
+        # The LIKE term must stay identical to idx_chat_messages_image_refs (migration v5) for the partial index to be used
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = sqlite3.Row
+            cursor = await db.execute(r"""
+                SELECT message
+                FROM chat_messages
+                WHERE session_id = ? AND message LIKE '%/api/file/im\_%' ESCAPE '\'
+                ORDER BY id DESC
+                LIMIT 1
+            """, (session_id,))
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+
+    async def get_latest_message_id(self, session_id: str) -> Optional[int]:
+        """Get the id of the newest message in a session (served by idx_chat_messages_session_id_id)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute("""
+                SELECT MAX(id) FROM chat_messages WHERE session_id = ?
+            """, (session_id,))
+            row = await cursor.fetchone()
+            return row[0] if row else None
+
     # ComfyUI workflow operations
     async def create_comfy_workflow(self, name: str, api_json: str, description: str, inputs: str, outputs: str = None):
         """Create a new comfy workflow"""
@@ -259,6 +306,116 @@ class SQLiteAdapter(DatabaseInterface):
             await db.execute("DELETE FROM files WHERE id = ?", (file_id,))
             await db.commit()
 
+    # Streaming reads (used by the DynamoDB migration tool)
+    def _reader_uri(self) -> str:
+        return Path(self.db_path).resolve().as_uri() + "?mode=ro"
+
+    async def _iter_rows(self, query: str, params: tuple = (), chunk_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Yield rows one by one, fetching chunk_size rows per round-trip"""
+        async with aiosqlite.connect(self._reader_uri(), uri=True) as db:
+            db.row_factory = sqlite3.Row
+            for pragma in READER_PRAGMAS:
+                await db.execute(pragma)
+            cursor = await db.execute(query, params)
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+
+    def iter_canvases(self, chunk_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream all canvases including their data"""
+        return self._iter_rows("""
+            SELECT id, name, description, thumbnail, data, created_at, updated_at
+            FROM canvases
+        """, chunk_size=chunk_size)
+
+    def iter_chat_sessions(self, chunk_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream chat sessions that belong to an existing canvas"""
+        return self._iter_rows("""
+            SELECT s.id, s.model, s.provider, s.canvas_id, s.title, s.created_at, s.updated_at
+            FROM chat_sessions s
+            JOIN canvases c ON c.id = s.canvas_id
+        """, chunk_size=chunk_size)
+
+    def iter_messages(self, session_id: str, chunk_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream messages of a chat session"""
+        return self._iter_rows("""
+            SELECT id, session_id, role, message, created_at, updated_at
+            FROM chat_messages
+            WHERE session_id = ?
+            ORDER BY id ASC
+        """, (session_id,), chunk_size=chunk_size)
+
+    def iter_comfy_workflows(self, chunk_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream all comfy workflows"""
+        return self._iter_rows("""
+            SELECT id, name, api_json, description, inputs, outputs, created_at, updated_at
+            FROM comfy_workflows
+        """, chunk_size=chunk_size)
+
+    def iter_files(self, chunk_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream all file records"""
+        return self._iter_rows("""
+            SELECT id, file_path, width, height, created_at, updated_at
+            FROM files
+        """, chunk_size=chunk_size)
+
+    def connect_reader(self) -> sqlite3.Connection:
+        """Open a read-only sqlite3 connection for bulk reads owned by a single worker thread"""
+        conn = sqlite3.connect(self._reader_uri(), uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in READER_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @staticmethod
+    def sync_iter_messages(conn: sqlite3.Connection, session_id: str, chunk_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """Yield a session's messages in chunks of chunk_size rows, without the aiosqlite thread hop per call"""
+        cursor = conn.execute("""
+            SELECT id, session_id, role, message, created_at, updated_at
+            FROM chat_messages
+            WHERE session_id = ?
+            ORDER BY id ASC
+        """, (session_id,))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [dict(row) for row in rows]
+
+    # Row counts (used by the migration dry run)
+    async def _count(self, query: str) -> int:
+        async with aiosqlite.connect(self._reader_uri(), uri=True) as db:
+            cursor = await db.execute(query)
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+
+    async def count_canvases(self) -> int:
+        return await self._count("SELECT COUNT(*) FROM canvases")
+
+    async def count_chat_sessions(self) -> int:
+        """Count sessions that belong to an existing canvas"""
+        return await self._count("""
+            SELECT COUNT(*) FROM chat_sessions s
+            JOIN canvases c ON c.id = s.canvas_id
+        """)
+
+    async def count_messages(self) -> int:
+        """Count messages whose session belongs to an existing canvas"""
+        return await self._count("""
+            SELECT COUNT(*) FROM chat_messages m
+            JOIN chat_sessions s ON s.id = m.session_id
+            JOIN canvases c ON c.id = s.canvas_id
+        """)
+
+    async def count_comfy_workflows(self) -> int:
+        return await self._count("SELECT COUNT(*) FROM comfy_workflows")
+
+    async def count_files(self) -> int:
+        return await self._count("SELECT COUNT(*) FROM files")
+
     # Database version operations
     async def get_db_version(self) -> int:
         """Get current database version"""
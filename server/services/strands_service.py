@@ -20,6 +20,7 @@ from services.db_service import db_service
 from services.config_service import config_service
 from services.websocket_service import send_to_websocket
 from services.strands_context import SessionContextManager
+from tools.strands_image_generators import create_generate_image_with_context
 
 
 def create_model_instance(text_model: Dict[str, Any]):
@@ -127,12 +128,7 @@ Be helpful, accurate, and creative in your responses.
         with SessionContextManager(session_id, canvas_id, {'image': image_model}):
             print(f"💬 Processing: {user_prompt[:50]}...")
 
-            # 验证上下文是否正确设置
-            from services.strands_context import get_image_model
-            context_image_model = get_image_model()
-
             # 创建带有上下文信息的图像生成工具
-            from tools.strands_image_generators import create_generate_image_with_context
             contextual_generate_image = create_generate_image_with_context(session_id, canvas_id, image_model)
 
             # 只使用带上下文的generate_image工具
@@ -314,14 +310,31 @@ async def handle_agent_event(event, session_id):
         return
     
     # 只处理重要的事件，减少噪音
-    if 'event' in event:
-        inner_event = event['event']
-        
+    inner_event = event.get('event')
+    if inner_event is not None:
+        # 处理文本和工具参数增量（每个 token 一次，最常见，先判断；每个键只查一次）
+        block_delta = inner_event.get('contentBlockDelta')
+        if block_delta is not None:
+            delta = block_delta['delta']
+            text = delta.get('text')
+            if text is not None:
+                await send_to_websocket(session_id, {
+                    'type': 'delta',
+                    'text': text
+                })
+            else:
+                tool_use_delta = delta.get('toolUse')
+                if tool_use_delta is not None:
+                    await send_to_websocket(session_id, {
+                        'type': 'tool_call_arguments',
+                        'id': '',
+                        'text': tool_use_delta.get('input', '')
+                    })
+
         # 处理工具调用开始
-        if 'contentBlockStart' in inner_event:
-            start = inner_event['contentBlockStart']['start']
-            if 'toolUse' in start:
-                tool_use = start['toolUse']
+        elif 'contentBlockStart' in inner_event:
+            tool_use = inner_event['contentBlockStart']['start'].get('toolUse')
+            if tool_use is not None:
                 print(f"🔧 Tool call started: {tool_use.get('name', '')}")
                 await send_to_websocket(session_id, {
                     'type': 'tool_call',
@@ -329,22 +342,7 @@ async def handle_agent_event(event, session_id):
                     'name': tool_use.get('name', ''),
                     'arguments': ''
                 })
-        
-        # 处理文本和工具参数增量
-        elif 'contentBlockDelta' in inner_event:
-            delta = inner_event['contentBlockDelta']['delta']
-            if 'text' in delta:
-                await send_to_websocket(session_id, {
-                    'type': 'delta',
-                    'text': delta['text']
-                })
-            elif 'toolUse' in delta:
-                await send_to_websocket(session_id, {
-                    'type': 'tool_call_arguments',
-                    'id': '',
-                    'text': delta['toolUse'].get('input', '')
-                })
-        
+
         # 处理工具调用完成
         elif 'contentBlockStop' in inner_event:
             stop_info = inner_event['contentBlockStop']
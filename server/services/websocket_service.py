@@ -1,17 +1,17 @@
 # services/websocket_service.py
-from services.websocket_state import sio, get_all_socket_ids
+from services.websocket_state import sio, get_connection_count
 import traceback
 
 async def broadcast_session_update(session_id: str, canvas_id: str, event: dict):
-    socket_ids = get_all_socket_ids()
-    if socket_ids:
+    if get_connection_count():
         try:
-            for socket_id in socket_ids:
-                await sio.emit('session_update', {
-                    'canvas_id': canvas_id,
-                    'session_id': session_id,
-                    **event
-                }, room=socket_id)
+            # Every connected socket receives the update: one broadcast emit serializes the
+            # payload once instead of awaiting a separate emit per socket
+            await sio.emit('session_update', {
+                'canvas_id': canvas_id,
+                'session_id': session_id,
+                **event
+            })
         except Exception as e:
             print(f"Error broadcasting session update for {session_id}: {e}")
             traceback.print_exc()
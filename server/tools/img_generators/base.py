@@ -1,23 +1,32 @@
 from abc import ABC, abstractmethod
 from typing import Optional, Tuple
 import base64
+import binascii
+import mmap
+import os
+import secrets
 from PIL import Image
 from io import BytesIO
 import aiofiles
-try:
-    from nanoid import generate
-except ImportError:
-    # Fallback ID generation if nanoid is not available
-    import random
-    import string
-    def generate(size=8):
-        return ''.join(random.choices(string.ascii_lowercase + string.digits, k=size))
 from utils.http_client import HttpClient
+from services.config_service import FILES_DIR
 
 
 class ImageGenerator(ABC):
     """Abstract base class for image generators"""
 
+    def supports_input_image(self, model: str) -> bool:
+        """Whether generate() makes use of input_image for this model"""
+        return True
+
+    def accepts_input_path(self, model: str) -> bool:
+        """
+        Whether generate() takes input_image as a local file path for this model and reads it itself,
+        so callers can skip reading and base64-encoding the file.
+        Callers pass input_is_path=True when they actually hand over a path
+        """
+        return False
+
     @abstractmethod
     async def generate(
         self,
@@ -43,6 +52,13 @@ class ImageGenerator(ABC):
         pass
 
 
+def validate_output_url(url, source):
+    """Reject empty or non-fetchable output URLs before trying to download them"""
+    if not url or not isinstance(url, str) or not url.startswith(('http://', 'https://', 'file://')):
+        raise Exception(f"Invalid output url from {source}: {url!r}")
+    return url
+
+
 async def get_image_info_and_save(url, file_path_without_extension, is_b64=False):
     """Shared utility function to download/decode and save image"""
     if is_b64:
@@ -74,6 +90,35 @@ async def get_image_info_and_save(url, file_path_without_extension, is_b64=False
     return mime_type, width, height, extension
 
 
+async def save_generated_image(url, is_b64=False):
+    """Save a generated image under a new id in FILES_DIR and return (image_id, width, height, filename)"""
+    image_id = generate_image_id()
+    mime_type, width, height, extension = await get_image_info_and_save(
+        url, os.path.join(FILES_DIR, image_id), is_b64=is_b64
+    )
+    return image_id, width, height, f'{image_id}.{extension}'
+
+
+# 3 的倍数，保证分块编码拼接后与整体编码结果一致
+BASE64_READ_CHUNK = 3 * 256 * 1024
+
+
+def encode_file_base64(file_path: str) -> str:
+    """
+    通过 mmap 按需读取文件页并分块编码，原始字节不会整体复制到内存，
+    峰值只有编码结果加一个分块。阻塞调用，异步代码中用 asyncio.to_thread 执行
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ''  # 空文件无法 mmap
+        out = bytearray()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, size, BASE64_READ_CHUNK):
+                out += binascii.b2a_base64(mm[offset:offset + BASE64_READ_CHUNK], newline=False)
+    return out.decode('ascii')
+
+
 def generate_image_id():
     """Generate unique image ID"""
-    return 'im_' + generate(size=8)
+    return 'im_' + secrets.token_urlsafe(6)
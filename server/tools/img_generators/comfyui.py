@@ -1,19 +1,23 @@
 from typing import Optional, Dict, Any
 import os
-import json
+import asyncio
 import sys
-import copy
-import random
-import traceback
+import secrets
+import functools
+import weakref
+from urllib.parse import urlsplit
+import logging
 try:
-    from .base import ImageGenerator, get_image_info_and_save, generate_image_id
+    from .base import ImageGenerator, save_generated_image, validate_output_url
 except ImportError:
     # 使用绝对导入作为备用
-    from tools.img_generators.base import ImageGenerator, get_image_info_and_save, generate_image_id
-from services.config_service import config_service, FILES_DIR
+    from tools.img_generators.base import ImageGenerator, save_generated_image, validate_output_url
+from services.config_service import config_service
+from utils.json_utils import loads as json_loads
 from routers.comfyui_execution import execute
 
 
+@functools.lru_cache(maxsize=32)
 def get_asset_path(filename):
     # To get the correct path for pyinstaller bundled application
     if getattr(sys, 'frozen', False):
@@ -27,6 +31,114 @@ def get_asset_path(filename):
     return os.path.join(base_path, 'asset', filename)
 
 
+@functools.lru_cache(maxsize=8)
+def _read_workflow_template(path: str, mtime_ns: int) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def load_workflow_template(path: str) -> bytes:
+    """读取工作流模板的原始 JSON 字节，进程内按 (路径, 修改时间) 缓存，文件被修改后会重新读取"""
+    return _read_workflow_template(path, os.stat(path).st_mtime_ns)
+
+
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=64)
+def get_workflow_family(model: str) -> str:
+    """Map a model name to the workflow it runs on: 'kontext', 'flux' or 'basic'"""
+    # 'kontext' takes priority over 'flux' (e.g. flux-kontext-dev), so it is checked first
+    if 'kontext' in model:
+        return 'kontext'
+    if 'flux' in model:
+        return 'flux'
+    return 'basic'
+
+
+DEFAULT_COMFYUI_PORT = 8188
+# 未配置 comfyui.max_concurrent 时同时执行的工作流数量
+DEFAULT_MAX_CONCURRENT_WORKFLOWS = 2
+
+
+@functools.lru_cache(maxsize=8)
+def parse_comfyui_address(api_url: str) -> tuple[str, str]:
+    """把配置里的 ComfyUI URL 解析为 (host, port)；按 URL 字符串缓存，配置修改后自然换新 key"""
+    parts = urlsplit(api_url if '://' in api_url else f'http://{api_url}')
+    host = parts.hostname
+    if not host:
+        raise Exception(f"Invalid ComfyUI URL: {api_url}")
+    if ':' in host:
+        # IPv6 地址在拼接 http://host:port 时需要方括号
+        host = f'[{host}]'
+    return host, str(parts.port or DEFAULT_COMFYUI_PORT)
+
+
+# When no input image is provided, a 1x1 transparent PNG is used as placeholder.
+# This prevents the ETN_LoadImageBase64 node from failing with empty string
+PLACEHOLDER_IMAGE_BASE64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAAC0lEQVQIHWNgAAIAAAUAAY27m/MAAAAASUVORK5CYII="
+
+# ComfyUI 种子范围 [0, 99999999998]；secrets 直接读取系统熵源，不经过 random 模块的全局状态
+SEED_RANGE = 99999999999
+
+
+def _new_seed() -> int:
+    return secrets.randbelow(SEED_RANGE)
+
+
+# 各工作流会改写的 (节点 ID, 输入名)，与下面的 _apply_*_params 保持一致
+FLUX_WORKFLOW_INPUTS = (('6', 'text'), ('31', 'seed'))
+BASIC_WORKFLOW_INPUTS = (('6', 'text'), ('4', 'ckpt_name'))
+KONTEXT_WORKFLOW_INPUTS = (('197', 'image'), ('196', 'text'), ('31', 'seed'))
+
+
+def _load_checked_template(path: str, required_inputs) -> Optional[bytes]:
+    """加载工作流模板并确认需要改写的节点输入都存在；失败时记录日志并返回 None"""
+    try:
+        template = load_workflow_template(path)
+        workflow = json_loads(template)
+        missing = [f'{node_id}.{name}' for node_id, name in required_inputs
+                   if name not in workflow.get(node_id, {}).get('inputs', {})]
+        if missing:
+            raise Exception(f"missing node inputs: {', '.join(missing)}")
+        return template
+    except Exception:
+        logger.exception("Failed to load ComfyUI workflow template %s", path)
+        return None
+
+
+def _max_concurrent_workflows() -> int:
+    """读取 comfyui.max_concurrent，转换为整数并至少为 1；0 会让所有请求永远等待，非法值回退到默认值"""
+    value = config_service.app_config.get('comfyui', {}).get(
+        'max_concurrent', DEFAULT_MAX_CONCURRENT_WORKFLOWS)
+    try:
+        max_concurrent = max(1, int(value))
+    except (TypeError, ValueError):
+        logger.warning("Invalid comfyui.max_concurrent %r, using %s", value, DEFAULT_MAX_CONCURRENT_WORKFLOWS)
+        max_concurrent = DEFAULT_MAX_CONCURRENT_WORKFLOWS
+    logger.info("ComfyUI workflows limited to %s concurrent executions", max_concurrent)
+    return max_concurrent
+
+
+# 每种工作流只需改写固定节点上的几个输入，按工作流形状直接赋值
+def _apply_flux_params(workflow: dict, prompt: str, seed: int) -> dict:
+    workflow['6']['inputs']['text'] = prompt
+    workflow['31']['inputs']['seed'] = seed
+    return workflow
+
+
+def _apply_basic_params(workflow: dict, prompt: str, ckpt_name: str) -> dict:
+    workflow['6']['inputs']['text'] = prompt
+    workflow['4']['inputs']['ckpt_name'] = ckpt_name
+    return workflow
+
+
+def _apply_kontext_params(workflow: dict, prompt: str, seed: int, image_base64: str) -> dict:
+    workflow['197']['inputs']['image'] = image_base64
+    workflow['196']['inputs']['text'] = prompt
+    workflow['31']['inputs']['seed'] = seed
+    return workflow
+
+
 class ComfyUIGenerator(ImageGenerator):
     """ComfyUI image generator implementation"""
 
@@ -38,18 +150,27 @@ class ComfyUIGenerator(ImageGenerator):
         flux_kontext_workflow = get_asset_path(
             'flux_kontext_workflow.json')
 
-        self.flux_comfy_workflow = None
-        self.basic_comfy_t2i_workflow = None
-        self.flux_kontext_workflow = None
+        # 工作流模板保存为原始 JSON 字节，每次请求解析出一份新的 dict，比 deepcopy 快得多；
+        # 加载时校验节点，模板缺少节点时该工作流不可用，而不是在用户请求时才 KeyError
+        self.flux_comfy_workflow = _load_checked_template(asset_dir, FLUX_WORKFLOW_INPUTS)
+        self.basic_comfy_t2i_workflow = _load_checked_template(basic_comfy_t2i_workflow, BASIC_WORKFLOW_INPUTS)
+        self.flux_kontext_workflow = _load_checked_template(flux_kontext_workflow, KONTEXT_WORKFLOW_INPUTS)
+
+        # 限制同时提交到 ComfyUI 的工作流数量，多余的请求在这里排队，避免 GPU 显存和模型缓存被挤爆。
+        # asyncio.Semaphore 绑定在首次使用它的事件循环上，而生成器是进程级单例，所以每个事件循环各一个
+        self._semaphores = weakref.WeakKeyDictionary()
 
-        try:
-            self.flux_comfy_workflow = json.load(open(asset_dir, 'r'))
-            self.basic_comfy_t2i_workflow = json.load(
-                open(basic_comfy_t2i_workflow, 'r'))
-            self.flux_kontext_workflow = json.load(
-                open(flux_kontext_workflow, 'r'))
-        except Exception as e:
-            traceback.print_exc()
+    async def _execute(self, workflow: dict, host: str, port: str, ctx: dict):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(_max_concurrent_workflows())
+        async with semaphore:
+            return await execute(workflow, host, port, ctx=ctx)
+
+    def supports_input_image(self, model: str) -> bool:
+        # Only the flux kontext workflow has an image input node
+        return get_workflow_family(model) == 'kontext'
 
     async def generate(
         self,
@@ -61,86 +182,62 @@ class ComfyUIGenerator(ImageGenerator):
     ) -> tuple[str, int, int, str]:
         # Get context from kwargs
         ctx = kwargs.get('ctx', {})
-        print(f"🎨 ComfyUI generating: {model}")
+        logger.info("🎨 ComfyUI generating: %s", model)
 
         api_url = config_service.app_config.get('comfyui', {}).get('url', '')
 
         if not api_url:
             raise Exception("ComfyUI URL not configured")
 
-        api_url = api_url.replace('http://', '').replace('https://', '')
-        host = api_url.split(':')[0]
-        port = api_url.split(':')[1]
+        host, port = parse_comfyui_address(api_url)
+
+        family = get_workflow_family(model)
 
         # Handle flux-kontext model
-        if 'kontext' in model:
+        if family == 'kontext':
             if not self.flux_kontext_workflow:
                 raise Exception('Flux kontext workflow json not found')
             return await self._run_flux_kontext_workflow(prompt, input_image, host, port, ctx)
 
         # Handle other flux models
-        elif 'flux' in model:
-            print(f"🔍 DEBUG: Using flux workflow for model: {model}")
+        elif family == 'flux':
+            logger.debug("Using flux workflow for model: %s", model)
             if not self.flux_comfy_workflow:
                 raise Exception('Flux workflow json not found')
-            workflow = copy.deepcopy(self.flux_comfy_workflow)
-            workflow['6']['inputs']['text'] = prompt
-            workflow['31']['inputs']['seed'] = random.randint(0, 99999999998)
-            print(f"🔍 DEBUG: Flux workflow configured with prompt and model")
+            workflow = _apply_flux_params(
+                json_loads(self.flux_comfy_workflow), prompt, _new_seed())
         else:
-            print(f"🔍 DEBUG: Using basic workflow for model: {model}")
+            logger.debug("Using basic workflow for model: %s", model)
             if not self.basic_comfy_t2i_workflow:
                 raise Exception('Basic workflow json not found')
-            workflow = copy.deepcopy(self.basic_comfy_t2i_workflow)
-            workflow['6']['inputs']['text'] = prompt
-            workflow['4']['inputs']['ckpt_name'] = model
-            print(f"🔍 DEBUG: Basic workflow configured with prompt and model")
+            workflow = _apply_basic_params(
+                json_loads(self.basic_comfy_t2i_workflow), prompt, model)
 
-        execution = await execute(workflow, host, port, ctx=ctx)
+        execution = await self._execute(workflow, host, port, ctx)
 
         if not execution.outputs:
             raise Exception("No outputs from ComfyUI execution")
 
-        url = execution.outputs[0]
+        url = validate_output_url(execution.outputs[0], 'ComfyUI')
 
-        # get image dimensions
-        image_id = generate_image_id()
-        mime_type, width, height, extension = await get_image_info_and_save(
-            url, os.path.join(FILES_DIR, f'{image_id}')
-        )
-        filename = f'{image_id}.{extension}'
-        return image_id, width, height, filename
+        return await save_generated_image(url)
 
     async def _run_flux_kontext_workflow(self, user_prompt: str, input_image_base64: Optional[str], host: str, port: str, ctx: dict) -> tuple[str, int, int, str]:
         """
         Run flux kontext workflow similar to the provided reference implementation
         """
-        workflow = copy.deepcopy(self.flux_kontext_workflow)
-
-        if input_image_base64:
-            workflow['197']['inputs']['image'] = input_image_base64
-        else:
-            # When no input image is provided, create a simple 1x1 pixel transparent PNG as placeholder
-            # This prevents the ETN_LoadImageBase64 node from failing with empty string
-            # 1x1 transparent PNG in base64
-            placeholder_image = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAAC0lEQVQIHWNgAAIAAAUAAY27m/MAAAAASUVORK5CYII="
-            workflow['197']['inputs']['image'] = placeholder_image
-            print("🔍 DEBUG: Using placeholder image for flux-kontext workflow (no input image provided)")
+        if not input_image_base64:
+            input_image_base64 = PLACEHOLDER_IMAGE_BASE64
+            logger.debug("Using placeholder image for flux-kontext workflow (no input image provided)")
 
-        workflow['196']['inputs']['text'] = user_prompt
-        workflow['31']['inputs']['seed'] = random.randint(0, 99999999998)
+        workflow = _apply_kontext_params(
+            json_loads(self.flux_kontext_workflow), user_prompt, _new_seed(), input_image_base64)
 
-        execution = await execute(workflow, host, port, ctx=ctx)
+        execution = await self._execute(workflow, host, port, ctx)
 
         if not execution.outputs:
             raise Exception('No outputs from flux kontext workflow')
 
-        url = execution.outputs[0]
+        url = validate_output_url(execution.outputs[0], 'ComfyUI')
 
-        # get image dimensions
-        image_id = generate_image_id()
-        mime_type, width, height, extension = await get_image_info_and_save(
-            url, os.path.join(FILES_DIR, f'{image_id}')
-        )
-        filename = f'{image_id}.{extension}'
-        return image_id, width, height, filename
+        return await save_generated_image(url)
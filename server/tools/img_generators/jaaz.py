@@ -1,11 +1,11 @@
 from typing import Optional
 import os
 import traceback
-import base64
+import asyncio
 try:
-    from .base import ImageGenerator, get_image_info_and_save, generate_image_id
+    from .base import ImageGenerator, get_image_info_and_save, generate_image_id, encode_file_base64
 except ImportError:
-    from tools.img_generators.base import ImageGenerator, get_image_info_and_save, generate_image_id
+    from tools.img_generators.base import ImageGenerator, get_image_info_and_save, generate_image_id, encode_file_base64
 from services.config_service import config_service, FILES_DIR
 from utils.http_client import HttpClient
 
@@ -13,6 +13,10 @@ from utils.http_client import HttpClient
 class JaazGenerator(ImageGenerator):
     """Jaaz Cloud image generator implementation"""
 
+    def accepts_input_path(self, model: str) -> bool:
+        # OpenAI 模型走 generate_openai_image，自己读取并编码本地文件
+        return model.startswith('openai/')
+
     async def generate(
         self,
         prompt: str,
@@ -108,11 +112,13 @@ class JaazGenerator(ImageGenerator):
         prompt: str,
         model: str,
         input_path: Optional[str] = None,
+        input_is_path: bool = False,
         **kwargs
     ) -> tuple[str, int, int, str]:
         """
         使用 Jaaz API 服务调用 OpenAI 模型生成图像
         兼容 OpenAI 图像生成 API
+        input_is_path 由调用方说明 input_path 是本地文件路径还是 base64 / data URL 内容
         """
         try:
             # 从配置中获取 Jaaz API 设置
@@ -144,15 +150,12 @@ class JaazGenerator(ImageGenerator):
 
             # 如果有输入图像（编辑模式）
             if input_path:
-                if input_path.startswith('data:'):
-                    data['input_image'] = input_path
+                if input_is_path:
+                    # 文件路径：在线程池中分块编码为 base64，不阻塞事件循环
+                    data['input_image'] = await asyncio.to_thread(encode_file_base64, input_path)
                 else:
-                    # 如果是文件路径，将图像转换为 base64
-                    with open(input_path, 'rb') as image_file:
-                        image_data = image_file.read()
-                        image_b64 = base64.b64encode(
-                            image_data).decode('utf-8')
-                        data['input_image'] = image_b64
+                    # data URL 或已经是 base64 的内容直接传递
+                    data['input_image'] = input_path
                 data['mask'] = None  # 如果需要遮罩，可以在这里添加
 
             print(
@@ -6,12 +6,17 @@ try:
 except ImportError:
     from tools.img_generators.base import ImageGenerator, get_image_info_and_save, generate_image_id
 from services.config_service import config_service, FILES_DIR
-from openai import OpenAI
+from openai import AsyncOpenAI
+import aiofiles
 
 
 class OpenAIGenerator(ImageGenerator):
     """OpenAI image generator implementation"""
 
+    def accepts_input_path(self, model: str) -> bool:
+        # images.edit opens the input file itself
+        return True
+
     async def generate(
         self,
         prompt: str,
@@ -26,24 +31,25 @@ class OpenAIGenerator(ImageGenerator):
             url = config_service.app_config.get('openai', {}).get('url', '')
             model = model.replace('openai/', '')
 
-            client = OpenAI(api_key=api_key, base_url=url)
-
-            if input_image:
-                # input_image should be the file path for OpenAI
-                with open(input_image, 'rb') as image_file:
-                    result = client.images.edit(
+            # 使用异步客户端，请求期间不阻塞事件循环
+            async with AsyncOpenAI(api_key=api_key, base_url=url) as client:
+                if input_image:
+                    # input_image should be the file path for OpenAI
+                    async with aiofiles.open(input_image, 'rb') as image_file:
+                        image_data = await image_file.read()
+                    result = await client.images.edit(
                         model=model,
-                        image=[image_file],
+                        image=[(os.path.basename(input_image), image_data)],
                         prompt=prompt,
                         n=kwargs.get("num_images", 1)
                     )
-            else:
-                result = client.images.generate(
-                    model=model,
-                    prompt=prompt,
-                    n=kwargs.get("num_images", 1),
-                    size=kwargs.get("size", "auto"),
-                )
+                else:
+                    result = await client.images.generate(
+                        model=model,
+                        prompt=prompt,
+                        n=kwargs.get("num_images", 1),
+                        size=kwargs.get("size", "auto"),
+                    )
 
             image_b64 = result.data[0].b64_json
             image_id = generate_image_id()
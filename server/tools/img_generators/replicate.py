@@ -2,9 +2,9 @@ from typing import Optional
 import os
 import traceback
 try:
-    from .base import ImageGenerator, get_image_info_and_save, generate_image_id
+    from .base import ImageGenerator, get_image_info_and_save, generate_image_id, validate_output_url
 except ImportError:
-    from tools.img_generators.base import ImageGenerator, get_image_info_and_save, generate_image_id
+    from tools.img_generators.base import ImageGenerator, get_image_info_and_save, generate_image_id, validate_output_url
 from services.config_service import config_service, FILES_DIR
 from utils.http_client import HttpClient
 
@@ -56,6 +56,7 @@ class ReplicateGenerator(ImageGenerator):
                 else:
                     raise Exception(
                         'Replicate image generation failed: no output url found')
+            validate_output_url(output, 'Replicate')
 
             image_id = generate_image_id()
             print('🦄image generation image_id', image_id)
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+SQLite -> DynamoDB 数据迁移工具
+
+Usage:
+    cd server
+    python tools/migrate_to_dynamodb.py [--dry-run] [--skip-existing] [--sqlite-path PATH] [--dynamodb-region REGION]
+
+Optional: `pip install aioboto3` to write through a native async DynamoDB client.
+"""
+import os
+import sys
+import asyncio
+import argparse
+import concurrent.futures
+import random
+import threading
+import traceback
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+# 确保服务器根目录在 Python 路径中
+server_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if server_root not in sys.path:
+    sys.path.insert(0, server_root)
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from services.sqlite_adapter import SQLiteAdapter
+from services.dynamodb_adapter import DynamoDBAdapter
+
+try:
+    # Native async client: BatchWriteItem/BatchGetItem become real async I/O instead of thread hops
+    import aioboto3
+except ImportError:
+    aioboto3 = None
+
+# BatchWriteItem accepts at most 25 put/delete requests per call
+BATCH_WRITE_SIZE = 25
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_SIZE = 100
+MAX_BATCH_RETRIES = 5
+# Concurrent BatchWriteItem calls in flight across all writers
+DDB_CONCURRENCY = int(os.getenv('DDB_CONCURRENCY', '8'))
+# Writer coroutines draining the read -> write pipeline, and how many batches may wait between them
+WRITE_WORKERS = 8
+PIPELINE_QUEUE_SIZE = 16
+# Seconds the message reader thread waits on a full queue before checking whether it should stop
+READER_STOP_POLL = 0.5
+# Seconds between progress lines, per-row prints cost more than the writes on large tables
+PROGRESS_INTERVAL = 2
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter so throttled writers don't retry in lockstep"""
+    return 0.05 * (2 ** attempt) + random.random() * 0.05
+
+
+def _clean_item(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop None values, DynamoDB index keys cannot be NULL"""
+    return {k: v for k, v in row.items() if v is not None}
+
+
+# Schema default (STRFTIME('%Y-%m-%dT%H:%M:%fZ')) first, then other layouts SQLite rows may carry
+CREATED_AT_FORMATS = (
+    '%Y-%m-%dT%H:%M:%S.%fZ',
+    '%Y-%m-%dT%H:%M:%SZ',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S',
+)
+EPOCH = datetime(1970, 1, 1)
+
+
+def _parse_created_at(value: Optional[str]) -> datetime:
+    for fmt in CREATED_AT_FORMATS:
+        try:
+            return datetime.strptime(value or '', fmt)
+        except ValueError:
+            continue
+    return EPOCH
+
+
+def _message_sort_key(row: Dict[str, Any]) -> str:
+    """
+    Build the DynamoDB range key for a migrated message.
+    Uses the same YYYYMMDD_HHMMSS_microseconds layout as DynamoDBService.create_message,
+    suffixed with the SQLite row id so re-running the migration overwrites instead of duplicating.
+    The key must be deterministic: an unparseable created_at falls back to the epoch, never to "now".
+    """
+    created = _parse_created_at(row.get('created_at'))
+    return f"{created.strftime('%Y%m%d_%H%M%S_%f')}_{int(row['id']):010d}"
+
+
+async def _chunked(rows: AsyncIterator[Dict[str, Any]], size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Group an async row stream into lists of at most size rows"""
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _canvas_item(canvas: Dict[str, Any]) -> Dict[str, Any]:
+    return _clean_item({
+        'id': canvas['id'],
+        'name': canvas['name'],
+        'description': canvas.get('description') or '',
+        'thumbnail': canvas.get('thumbnail') or '',
+        'data': canvas.get('data'),
+        'created_at': canvas.get('created_at'),
+        'updated_at': canvas.get('updated_at'),
+    })
+
+
+def _session_item(session: Dict[str, Any]) -> Dict[str, Any]:
+    return _clean_item({
+        'id': session['id'],
+        'model': session.get('model'),
+        'provider': session.get('provider'),
+        'canvas_id': session.get('canvas_id'),
+        'title': session.get('title') or '',
+        'created_at': session.get('created_at'),
+        'updated_at': session.get('updated_at'),
+    })
+
+
+def _message_wire_item(message: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a migrated message directly in DynamoDB wire format.
+    Every message attribute is a string, so the generic TypeSerializer dispatch is skipped
+    on the hot path of the largest table.
+    """
+    item = {
+        'session_id': {'S': message['session_id']},
+        'id': {'S': _message_sort_key(message)},
+    }
+    for key in ('role', 'message', 'created_at', 'updated_at'):
+        value = message.get(key)
+        if value is not None:
+            item[key] = {'S': str(value)}
+    return item
+
+
+def _workflow_item(workflow: Dict[str, Any]) -> Dict[str, Any]:
+    return _clean_item({
+        'id': str(workflow['id']),
+        'name': workflow.get('name'),
+        'api_json': workflow.get('api_json'),
+        'description': workflow.get('description'),
+        'inputs': workflow.get('inputs'),
+        'outputs': workflow.get('outputs') or '',
+        'created_at': workflow.get('created_at'),
+        'updated_at': workflow.get('updated_at'),
+    })
+
+
+def _file_item(file_record: Dict[str, Any]) -> Dict[str, Any]:
+    return _clean_item({
+        'id': file_record['id'],
+        'file_path': file_record.get('file_path'),
+        'width': file_record.get('width'),
+        'height': file_record.get('height'),
+        'created_at': file_record.get('created_at'),
+        'updated_at': file_record.get('updated_at'),
+    })
+
+
+class DataMigrator:
+    """Copies every SQLite table into the matching DynamoDB table"""
+
+    def __init__(self, sqlite_path: Optional[str] = None, region_name: str = 'us-west-2', dry_run: bool = False,
+                 skip_existing: bool = False):
+        # PutRequest already overwrites, so existence lookups only run when asked to preserve DynamoDB rows
+        self.skip_existing = skip_existing
+        # The source database is only read: a missing path fails instead of creating an empty DB,
+        # and its schema is never migrated
+        self.sqlite_adapter = SQLiteAdapter.open_readonly(sqlite_path)
+        # Bulk message reads run on one worker thread over a plain sqlite3 connection
+        self.sqlite_conn = self.sqlite_adapter.connect_reader()
+        self.dynamodb_adapter = None
+        if not dry_run:
+            self.dynamodb_adapter = DynamoDBAdapter(region_name=region_name)
+            self.dynamodb_service = self.dynamodb_adapter.dynamodb_service
+        self._write_semaphore = asyncio.Semaphore(DDB_CONCURRENCY)
+        self._client_stack = AsyncExitStack()
+        self._async_client = None
+        self._serializer = TypeSerializer()
+        self._progress = 0
+        self._skipped = 0
+
+    async def _list_all_sessions(self) -> List[Dict[str, Any]]:
+        """Fetch the chat sessions of all canvases in one read-only query"""
+        return [session async for session in self.sqlite_adapter.iter_chat_sessions()]
+
+    async def _open_client(self):
+        """Open one aioboto3 client shared by the whole migration, when aioboto3 is installed"""
+        if aioboto3 is None or self._async_client is not None:
+            return
+        session = aioboto3.Session()
+        self._async_client = await self._client_stack.enter_async_context(
+            session.client('dynamodb', region_name=self.dynamodb_service.region_name))
+
+    async def _call(self, operation: str, **kwargs) -> Dict[str, Any]:
+        """Invoke a DynamoDB client operation, falling back to the sync boto3 client on a worker thread"""
+        if self._async_client is not None:
+            return await getattr(self._async_client, operation)(**kwargs)
+        return await asyncio.to_thread(getattr(self.dynamodb_service.client, operation), **kwargs)
+
+    def _serialize_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: self._serializer.serialize(value) for key, value in item.items()}
+
+    async def _flush(self, table_name: str, requests: List[Dict[str, Any]]):
+        """Send one BatchWriteItem call, retrying UnprocessedItems and throttling errors with backoff"""
+        async with self._write_semaphore:
+            for attempt in range(MAX_BATCH_RETRIES + 1):
+                try:
+                    response = await self._call('batch_write_item', RequestItems={table_name: requests})
+                    requests = response.get('UnprocessedItems', {}).get(table_name, [])
+                    if not requests:
+                        return
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'ProvisionedThroughputExceededException':
+                        raise
+                await asyncio.sleep(_backoff_delay(attempt))
+        raise Exception(f"{len(requests)} items left unprocessed in {table_name}")
+
+    async def _batch_put(self, table_key: str, items: List[Dict[str, Any]], serialized: bool = False):
+        """
+        Write items with BatchWriteItem, 25 per call, at most DDB_CONCURRENCY calls in flight.
+        Pass serialized=True when items are already in DynamoDB wire format.
+        Goes through the low-level client (thread-safe, unlike the resource) so concurrent
+        writers and SQLite reads actually overlap.
+        """
+        table_name = self.dynamodb_service.tables[table_key]
+        batches = [items[start:start + BATCH_WRITE_SIZE] for start in range(0, len(items), BATCH_WRITE_SIZE)]
+
+        async def flush(batch):
+            requests = [{'PutRequest': {'Item': item if serialized else self._serialize_item(item)}}
+                        for item in batch]
+            await self._flush(table_name, requests)
+            self._progress += len(batch)
+
+        await asyncio.gather(*(flush(batch) for batch in batches))
+
+    async def _existing_ids(self, table_key: str, ids: List[str]) -> set:
+        """Return the subset of ids already present in DynamoDB, 100 keys per BatchGetItem call"""
+        if not self.skip_existing:
+            return set()
+        table_name = self.dynamodb_service.tables[table_key]
+        existing = set()
+        for start in range(0, len(ids), BATCH_GET_SIZE):
+            request = {
+                'Keys': [{'id': {'S': id}} for id in ids[start:start + BATCH_GET_SIZE]],
+                'ProjectionExpression': '#id',
+                'ExpressionAttributeNames': {'#id': 'id'},
+            }
+            for attempt in range(MAX_BATCH_RETRIES + 1):
+                response = await self._call('batch_get_item', RequestItems={table_name: request})
+                existing.update(item['id']['S'] for item in response.get('Responses', {}).get(table_name, []))
+                request = response.get('UnprocessedKeys', {}).get(table_name)
+                if not request:
+                    break
+                await asyncio.sleep(_backoff_delay(attempt))
+            else:
+                raise Exception(f"{len(request['Keys'])} keys left unprocessed in {table_name}")
+        return existing
+
+    async def _write_pipeline(self, table_key: str, produce, serialized: bool = False) -> int:
+        """
+        Run produce(queue) as the SQLite-reading producer while WRITE_WORKERS consumers
+        drain batches from a bounded queue into DynamoDB, so reads and writes overlap.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        written = 0
+        errors = []
+
+        async def consume():
+            nonlocal written
+            while True:
+                items = await queue.get()
+                try:
+                    if not errors:
+                        await self._batch_put(table_key, items, serialized)
+                        written += len(items)
+                except Exception as e:
+                    # Keep draining so the producer never blocks on a full queue
+                    errors.append(e)
+                finally:
+                    queue.task_done()
+
+        consumers = [asyncio.create_task(consume()) for _ in range(WRITE_WORKERS)]
+        try:
+            await produce(queue)
+            await queue.join()
+        finally:
+            for consumer in consumers:
+                consumer.cancel()
+        if errors:
+            raise errors[0]
+        return written
+
+    async def _migrate_rows(self, table_key: str, rows: AsyncIterator[Dict[str, Any]], to_item) -> int:
+        """
+        Stream rows into DynamoDB BATCH_GET_SIZE rows at a time, overwriting existing items
+        (or skipping them with --skip-existing). Peak memory stays at one chunk regardless of table size.
+        """
+        migrated = 0
+        async for chunk in _chunked(rows, BATCH_GET_SIZE):
+            items = [to_item(row) for row in chunk]
+            existing = await self._existing_ids(table_key, [item['id'] for item in items])
+            self._skipped += len(existing)
+            items = [item for item in items if item['id'] not in existing]
+            await self._batch_put(table_key, items)
+            migrated += len(items)
+        return migrated
+
+    async def migrate_canvases(self):
+        """Migrate canvases"""
+        count = await self._migrate_rows('canvases', self.sqlite_adapter.iter_canvases(), _canvas_item)
+        print(f"✅ Migrated {count} canvases")
+
+    def _read_messages(self, sessions: List[Dict[str, Any]], queue: asyncio.Queue, loop: asyncio.AbstractEventLoop,
+                       stop: threading.Event):
+        """Runs on a worker thread: read every session's messages and hand batches to the writers until stop is set"""
+        for session in sessions:
+            for chunk in self.sqlite_adapter.sync_iter_messages(self.sqlite_conn, session['id'], BATCH_WRITE_SIZE):
+                if stop.is_set():
+                    return
+                items = [_message_wire_item(message) for message in chunk]
+                # Blocks this thread (not the loop) while the queue is full, but gives up once the
+                # pipeline is cancelled and nobody drains the queue any more
+                future = asyncio.run_coroutine_threadsafe(queue.put(items), loop)
+                while True:
+                    try:
+                        future.result(timeout=READER_STOP_POLL)
+                        break
+                    except concurrent.futures.TimeoutError:
+                        if stop.is_set():
+                            future.cancel()
+                            return
+
+    async def _produce_messages(self, sessions: List[Dict[str, Any]], queue: asyncio.Queue):
+        """Stream every session's messages into the queue, BATCH_WRITE_SIZE at a time"""
+        stop = threading.Event()
+        reader = asyncio.ensure_future(asyncio.to_thread(
+            self._read_messages, sessions, queue, asyncio.get_running_loop(), stop))
+        try:
+            await asyncio.shield(reader)
+        finally:
+            # On cancellation wait for the thread to stop, so close() never shuts sqlite_conn under it
+            stop.set()
+            await asyncio.wait([reader])
+
+    async def _put_sessions(self, sessions: List[Dict[str, Any]]) -> int:
+        existing = await self._existing_ids('chat_sessions', [session['id'] for session in sessions])
+        self._skipped += len(existing)
+        items = [_session_item(session) for session in sessions if session['id'] not in existing]
+        await self._batch_put('chat_sessions', items)
+        return len(items)
+
+    async def migrate_sessions_and_messages(self):
+        """
+        Migrate chat sessions and their messages in one pass over canvases/sessions.
+        Session writes run alongside the message pipeline instead of as a separate step.
+        Messages are always written: their keys are deterministic, so a re-run overwrites them with
+        the same content, and --skip-existing only applies to sessions.
+        """
+        sessions = await self._list_all_sessions()
+        tasks = [
+            asyncio.create_task(self._put_sessions(sessions)),
+            asyncio.create_task(self._write_pipeline(
+                'chat_messages', lambda queue: self._produce_messages(sessions, queue), serialized=True)),
+        ]
+        try:
+            session_count, message_count = await asyncio.gather(*tasks)
+        except BaseException:
+            # gather does not cancel the sibling; stop it before close() runs
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        print(f"✅ Migrated {session_count} chat sessions")
+        print(f"✅ Migrated {message_count} chat messages")
+
+    async def migrate_comfy_workflows(self):
+        """Migrate ComfyUI workflows"""
+        count = await self._migrate_rows('comfy_workflows', self.sqlite_adapter.iter_comfy_workflows(), _workflow_item)
+        print(f"✅ Migrated {count} comfy workflows")
+
+    async def migrate_files(self):
+        """Migrate file records"""
+        count = await self._migrate_rows('files', self.sqlite_adapter.iter_files(), _file_item)
+        print(f"✅ Migrated {count} files")
+
+    async def _progress_reporter(self):
+        """Print a running total every PROGRESS_INTERVAL seconds instead of one line per row"""
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            print(f"⏳ {self._progress} items written, {self._skipped} already present")
+
+    async def close(self):
+        await self._client_stack.aclose()
+        self.sqlite_conn.close()
+
+    async def migrate_all(self):
+        """Run every migration step in dependency order"""
+        print("🚀 Starting SQLite -> DynamoDB migration")
+        await self._open_client()
+        reporter = asyncio.create_task(self._progress_reporter())
+        try:
+            await self.migrate_canvases()
+            await self.migrate_sessions_and_messages()
+            await self.migrate_comfy_workflows()
+            await self.migrate_files()
+        finally:
+            reporter.cancel()
+        print(f"🎉 Migration completed: {self._progress} items written, {self._skipped} already present")
+
+    async def dry_run(self):
+        """Print what would be migrated without writing anything"""
+        adapter = self.sqlite_adapter
+        canvases, sessions, messages, workflows, files = await asyncio.gather(
+            adapter.count_canvases(), adapter.count_chat_sessions(), adapter.count_messages(),
+            adapter.count_comfy_workflows(), adapter.count_files())
+
+        print("🔍 Dry run - data that would be migrated:")
+        print(f"   Canvases: {canvases}")
+        print(f"   Chat sessions: {sessions}")
+        print(f"   Chat messages: {messages}")
+        print(f"   Comfy workflows: {workflows}")
+        print(f"   Files: {files}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Migrate data from SQLite to DynamoDB')
+    parser.add_argument('--sqlite-path', default=None,
+                        help='Path to the SQLite database (defaults to user_data/localmanus.db)')
+    parser.add_argument('--dynamodb-region', default='us-west-2',
+                        help='AWS region of the DynamoDB tables')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Show what would be migrated without writing to DynamoDB')
+    parser.add_argument('--skip-existing', action='store_true',
+                        help='Keep items already in DynamoDB instead of overwriting them '
+                             '(chat messages are always rewritten with the same keys)')
+    args = parser.parse_args()
+
+    migrator = None
+    try:
+        migrator = DataMigrator(args.sqlite_path, args.dynamodb_region, dry_run=args.dry_run,
+                                skip_existing=args.skip_existing)
+        if args.dry_run:
+            await migrator.dry_run()
+        else:
+            await migrator.migrate_all()
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        traceback.print_exc()
+        sys.exit(1)
+    finally:
+        if migrator:
+            await migrator.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -8,55 +8,80 @@ Strands格式的图像生成工具
 # 这可以防止 "tool function missing" 警告
 __STRANDS_TOOL__ = False
 __all__ = ['create_generate_image_with_context', 'generate_file_id', 'generate_image_id', 'strands_image_generators']
-import random
 import base64
-import json
-import traceback
+import binascii
+import secrets
+import re
+import logging
 import os
 import asyncio
-from mimetypes import guess_type
+import functools
+import glob
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 from pydantic import BaseModel, Field
 from strands import tool
-import aiofiles
-try:
-    from nanoid import generate
-except ImportError:
-    # Fallback ID generation if nanoid is not available
-    import random
-    import string
-    def generate(size=8):
-        return ''.join(random.choices(string.ascii_lowercase + string.digits, k=size))
 
 from common import DEFAULT_PORT
 from services.config_service import FILES_DIR
 from services.db_service import db_service
 from services.websocket_service import send_to_websocket, broadcast_session_update
+from tools.img_generators.base import encode_file_base64
 
-# 辅助函数：安全地执行异步操作
-def run_async_safe(coro, timeout=10):
-    """安全地运行异步操作，自动处理事件循环"""
-    try:
-        # 尝试获取当前事件循环
-        loop = asyncio.get_running_loop()
-        # 如果有运行中的事件循环，创建任务
-        import concurrent.futures
-
-        def run_in_thread():
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
-            try:
-                return new_loop.run_until_complete(coro)
-            finally:
-                new_loop.close()
+try:
+    # libuv 实现的事件循环，Windows 上不可用时回退到 asyncio 默认循环
+    import uvloop
+    _new_event_loop = uvloop.new_event_loop
+except ImportError:
+    _new_event_loop = asyncio.new_event_loop
+
+logger = logging.getLogger(__name__)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(run_in_thread)
-            return future.result(timeout=timeout)
+# 生成的图片都保存在 FILES_DIR，模块加载时创建一次，工具调用中不再重复检查
+os.makedirs(FILES_DIR, exist_ok=True)
 
-    except RuntimeError:
-        # 没有运行中的事件循环，可以直接使用 asyncio.run
-        return asyncio.run(coro)
+# 常驻后台事件循环：工具是同步函数，所有异步操作都提交到这个循环上执行，
+# 而不是每次调用都新建线程池和事件循环
+IMAGE_IO_WORKERS = 8
+_background_loop = None
+_background_thread = None
+_background_loop_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop, _background_thread
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = _new_event_loop()
+            # 后台循环里的 asyncio.to_thread（base64 分块编码、数据库写入）使用独立线程池，
+            # 不与进程内其他阻塞任务争用默认线程池
+            _background_loop.set_default_executor(
+                ThreadPoolExecutor(max_workers=IMAGE_IO_WORKERS, thread_name_prefix='img-io'))
+            _background_thread = threading.Thread(
+                target=_background_loop.run_forever, name='image-tool-loop', daemon=True)
+            _background_thread.start()
+    return _background_loop
+
+
+async def close_background_clients():
+    """应用关闭时调用：关闭常驻后台循环上的 ComfyUI 长连接客户端"""
+    if _background_loop is None:
+        return
+    from routers.comfyui_execution import close_client
+    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(close_client(), _background_loop))
+
+
+# 辅助函数：安全地执行异步操作
+def run_async_safe(coro, timeout=None):
+    """在常驻后台事件循环上运行协程，并在当前线程同步等待结果"""
+    loop = _get_background_loop()
+    if threading.current_thread() is _background_thread:
+        coro.close()
+        raise RuntimeError("run_async_safe cannot block the background loop it runs on")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=timeout)
 
 # Import all generators with absolute imports
 try:
@@ -94,7 +119,76 @@ except ImportError as e:
 
 # 生成唯一文件 ID
 def generate_file_id():
-    return 'im_' + generate(size=8)
+    # 6 个随机字节 -> 8 个 URL 安全字符，与 nanoid 的默认字母表相同
+    return 'im_' + secrets.token_urlsafe(6)
+
+
+# 字符串消息中的图像引用，如 ![...](/api/file/im_xxx.jpeg)
+IMAGE_REF_PATTERN = re.compile(r'/api/file/(im_[a-zA-Z0-9_-]+\.[a-zA-Z0-9]+)', re.ASCII)
+# 助手生成图像后保存的消息。图像ID只含 URL 安全字符，无需 JSON 转义，
+# 直接填入模板即可，等价于 dumps({'role': 'assistant', 'content': [{'type': 'image_url', 'image_url': {'url': ...}}]})
+IMAGE_MESSAGE_TEMPLATE = '{"role": "assistant", "content": [{"type": "image_url", "image_url": {"url": "/api/file/%s"}}]}'
+# URL 安全 base64 到标准 base64 的字符映射
+URLSAFE_TO_STANDARD_B64 = str.maketrans('-_', '+/')
+
+
+def _last_image_ref(content: str) -> Optional[str]:
+    """从后往前查找字符串中最后一个图像引用，找到即返回，不需要收集全部匹配"""
+    pos = len(content)
+    while (pos := content.rfind('/api/file/', 0, pos)) != -1:
+        match = IMAGE_REF_PATTERN.match(content, pos)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _normalize_base64(value: str) -> Optional[str]:
+    """
+    校验 base64 并返回去掉空白（如 MIME 换行）的标准字母表形式；URL 安全字母表（-/_）会转换为 +/。
+    不是合法 base64 时返回 None
+    """
+    compact = ''.join(value.split())
+    try:
+        base64.b64decode(compact, validate=True)
+        return compact
+    except (binascii.Error, ValueError):
+        pass
+    try:
+        base64.b64decode(compact, altchars=b'-_', validate=True)
+        return compact.translate(URLSAFE_TO_STANDARD_B64)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def _classify_input_image(value: str) -> str:
+    """
+    判断 input_image 参数的类型：'empty' / 'file_id' / 'data_url' / 'base64'
+    只做前缀判断；其余输入都按 base64 处理，由 _normalize_base64 校验
+    """
+    if not value:
+        return 'empty'
+    # 文件ID，如 'im_mzp-QKbW.jpeg'，或工具返回的不带扩展名的 'im_mzp-QKbW'
+    if value.startswith('im_'):
+        return 'file_id'
+    if value.startswith('data:'):
+        return 'data_url'
+    return 'base64'
+
+
+def _extract_image_url(item) -> Optional[str]:
+    """取出 {'type': 'image_url', 'image_url': {'url': ...}} 内容项中的 url，其他内容项返回 None"""
+    try:
+        if item['type'] != 'image_url':
+            return None
+        return item['image_url']['url']
+    except (KeyError, TypeError):
+        return None
+
+
+# session_id -> (该会话最新消息ID, 最近图像的文件ID)
+# 最新消息ID不变说明会话没有新消息，可以直接复用上次的结果
+_recent_image_cache = {}
+RECENT_IMAGE_CACHE_SIZE = 1024
 
 
 def get_most_recent_image_from_session(session_id: str) -> str:
@@ -108,61 +202,202 @@ def get_most_recent_image_from_session(session_id: str) -> str:
         最近图像的文件ID，如果没有找到则返回空字符串
     """
     try:
-        # 获取session的聊天历史
-        messages = db_service.get_chat_history(session_id)
-
-        # 从最新的消息开始查找图像消息
-        for i, message in enumerate(reversed(messages)):
-            # 查找助手生成的图像和用户上传的图像
-            if message.get('content'):
-                content = message.get('content', [])
-
-                # 处理字符串格式的content（可能包含图像引用）
-                if isinstance(content, str):
-                    # 查找字符串中的图像引用，如 ![...](/api/file/im_xxx.jpeg)
-                    import re
-                    image_pattern = r'/api/file/(im_[a-zA-Z0-9_-]+\.[a-zA-Z0-9]+)'
-                    matches = re.findall(image_pattern, content)
-                    if matches:
-                        file_id = matches[-1]  # 取最后一个匹配的图像
-                        print(f"� Found recent image in session: {file_id}")
-                        return file_id
-
-                # 处理列表格式的content
-                elif isinstance(content, list):
-                    for item in content:
-                        if (isinstance(item, dict) and
-                            item.get('type') == 'image_url' and
-                            item.get('image_url', {}).get('url')):
-
-                            url = item['image_url']['url']
-                            # 从URL中提取文件ID，例如 '/api/file/im_abc123.png' -> 'im_abc123.png'
-                            if '/api/file/' in url:
-                                file_id = url.split('/api/file/')[-1]
-                                print(f"� Found recent image in session: {file_id}")
-                                return file_id
+        latest_message_id = db_service.get_latest_message_id(session_id)
+    except Exception as e:
+        logger.warning("Error getting latest message id for session %s: %s", session_id, e)
+        return _find_most_recent_image(session_id) or ""
+
+    cached = _recent_image_cache.get(session_id)
+    if cached and cached[0] == latest_message_id:
+        return cached[1]
+
+    file_id = _find_most_recent_image(session_id)
+    if file_id is not None:
+        if len(_recent_image_cache) >= RECENT_IMAGE_CACHE_SIZE:
+            # dict 保持插入顺序，淘汰最早加入的会话
+            _recent_image_cache.pop(next(iter(_recent_image_cache)), None)
+        _recent_image_cache[session_id] = (latest_message_id, file_id)
+    return file_id or ""
+
+
+def _find_most_recent_image(session_id: str) -> Optional[str]:
+    """查询数据库中最近的图像ID；出错时返回 None，这样错误结果不会被缓存"""
+    try:
+        # 只从数据库取最近一条引用了 /api/file/ 的消息，而不是整个聊天历史
+        message = db_service.get_last_image_message(session_id)
+        if not message or not message.get('content'):
+            return ""
+
+        content = message.get('content', [])
+
+        # 处理字符串格式的content（可能包含图像引用）
+        if isinstance(content, str):
+            # 查找字符串中的图像引用，取最后一个
+            file_id = _last_image_ref(content)
+            if file_id:
+                logger.debug("Found recent image in session %s: %s", session_id, file_id)
+                return file_id
+
+        # 处理列表格式的content，从后往前找，与字符串格式一样取消息中最后一张图像
+        elif isinstance(content, list):
+            for item in reversed(content):
+                url = _extract_image_url(item)
+                # 从URL中提取文件ID，例如 '/api/file/im_abc123.png' -> 'im_abc123.png'；视频 (vi_) 跳过
+                if url and '/api/file/im_' in url:
+                    file_id = url.split('/api/file/')[-1]
+                    logger.debug("Found recent image in session %s: %s", session_id, file_id)
+                    return file_id
 
         return ""
 
     except Exception as e:
-        print(f"❌ Error getting recent image from session {session_id}: {e}")
-        return ""
+        logger.warning("Error getting recent image from session %s: %s", session_id, e)
+        return None
+
 
+# 无扩展名的图像ID按此顺序匹配文件
+IMAGE_EXTENSIONS = ('png', 'jpg', 'jpeg', 'gif', 'webp')
 
-# Initialize provider instances
-PROVIDERS = {
-    'replicate': ReplicateGenerator(),
-    'comfyui': ComfyUIGenerator(),
-    'wavespeed': WavespeedGenerator(),
-    'jaaz': JaazGenerator(),
-    'openai': OpenAIGenerator(),
+
+@functools.lru_cache(maxsize=4096)
+def _lookup_image_file_path(image_id: str) -> str:
+    """数据库查找 + 扩展名探测；找不到时抛出异常，这样未命中的结果不会被缓存"""
+    file_record = None
+    file_id_without_ext = image_id.split('.')[0] if '.' in image_id else image_id
+    try:
+        file_record = db_service.get_file(file_id_without_ext)
+    except Exception:
+        pass  # 静默处理数据库查找错误
+
+    if file_record:
+        # 使用数据库中的文件路径
+        file_path = os.path.join(FILES_DIR, file_record['file_path'])
+    else:
+        # 尝试直接路径
+        file_path = os.path.join(FILES_DIR, image_id)
+
+        # 如果文件不存在且没有扩展名，一次目录扫描找出 image_id.* ，按常见扩展名优先级选取
+        if not os.path.exists(file_path) and '.' not in image_id:
+            candidates = glob.glob(os.path.join(glob.escape(FILES_DIR), glob.escape(image_id) + '.*'))
+            by_ext = {os.path.splitext(c)[1][1:]: c for c in candidates}
+            for ext in IMAGE_EXTENSIONS:
+                if ext in by_ext:
+                    file_path = by_ext[ext]
+                    break
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(file_path)
+    return file_path
+
+
+# 本进程生成的图像路径在保存时就已知，直接登记，后续编辑时不用再查库和 stat
+_generated_image_paths = {}
+GENERATED_IMAGE_PATHS_SIZE = 4096
+
+
+def remember_image_file_path(image_id: str, filename: str):
+    """登记新生成图像的路径，图像ID带或不带扩展名都能命中"""
+    if len(_generated_image_paths) >= GENERATED_IMAGE_PATHS_SIZE:
+        _generated_image_paths.clear()
+    file_path = os.path.join(FILES_DIR, filename)
+    _generated_image_paths[image_id] = file_path
+    _generated_image_paths[filename] = file_path
+
+
+def resolve_image_file_path(image_id: str) -> Optional[str]:
+    """
+    把图像ID解析为磁盘路径，结果按ID缓存。
+    命中缓存时不再 stat，读取时遇到 FileNotFoundError 再调用 forget_image_file_paths 失效。
+    """
+    file_path = _generated_image_paths.get(image_id)
+    if file_path:
+        return file_path
+    try:
+        return _lookup_image_file_path(image_id)
+    except FileNotFoundError:
+        return None
+
+
+def forget_image_file_paths():
+    """清空路径缓存（缓存的文件已被删除时调用）"""
+    _generated_image_paths.clear()
+    _lookup_image_file_path.cache_clear()
+
+
+# 最近编码过的输入图片，键为 (路径, mtime, 大小)，文件被改写后自然失效。
+# 反复基于同一张图编辑时不用重新读取和编码
+BASE64_CACHE_MAX_ENTRIES = 32
+BASE64_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_base64_cache = OrderedDict()
+_base64_cache_bytes = 0
+_base64_cache_lock = threading.Lock()
+
+
+def _cached_file_base64(file_path: str) -> str:
+    global _base64_cache_bytes
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    with _base64_cache_lock:
+        encoded = _base64_cache.get(key)
+        if encoded is not None:
+            _base64_cache.move_to_end(key)
+            return encoded
+
+    encoded = encode_file_base64(file_path)
+    if len(encoded) <= BASE64_CACHE_MAX_BYTES:
+        with _base64_cache_lock:
+            if key not in _base64_cache:
+                _base64_cache[key] = encoded
+                _base64_cache_bytes += len(encoded)
+            while len(_base64_cache) > BASE64_CACHE_MAX_ENTRIES or _base64_cache_bytes > BASE64_CACHE_MAX_BYTES:
+                _, evicted = _base64_cache.popitem(last=False)
+                _base64_cache_bytes -= len(evicted)
+    return encoded
+
+
+async def read_file_base64(file_path: str) -> str:
+    """在 img-io 线程池中读取文件并返回 base64 字符串，整个读取 + 编码只切换一次线程，不阻塞事件循环"""
+    return await asyncio.to_thread(_cached_file_base64, file_path)
+
+
+# Provider classes; instances are created on first use so importing this module
+# does not construct every generator (e.g. ComfyUI loading its workflow JSON)
+PROVIDER_CLASSES = {
+    'replicate': ReplicateGenerator,
+    'comfyui': ComfyUIGenerator,
+    'wavespeed': WavespeedGenerator,
+    'jaaz': JaazGenerator,
+    'openai': OpenAIGenerator,
 }
+_providers = {}
+
+
+def get_provider(name: str):
+    """返回 provider 的单例生成器，未知 provider 返回 None"""
+    generator = _providers.get(name)
+    if generator is None:
+        generator_class = PROVIDER_CLASSES.get(name)
+        if generator_class is None:
+            return None
+        generator = _providers.setdefault(name, generator_class())
+    return generator
+
+
+async def warm_up_providers(names=('comfyui',)):
+    """启动时在线程中预先创建会读磁盘的生成器（如 ComfyUI 加载工作流模板），避免首个请求阻塞事件循环"""
+    await asyncio.gather(*(asyncio.to_thread(get_provider, name) for name in names))
 
 
 def create_generate_image_with_context(session_id: str, canvas_id: str, image_model: dict):
     """创建一个带有上下文信息的 generate_image 工具"""
-    from strands import tool
-
+    # image_model 在工具生命周期内不变，创建时一次性解析 model/provider/generator
+    model = image_model.get('model', 'flux-kontext')
+    provider = image_model.get('provider', 'comfyui')
+    generator = get_provider(provider)
+    # 不使用输入图片的模型（如 ComfyUI 文生图工作流）无需查找和读取上一张图片
+    model_uses_input_image = generator.supports_input_image(model) if hasattr(generator, 'supports_input_image') else True
+    # 能直接接收本地路径的生成器（如 OpenAI images.edit）无需读取文件并 base64 编码
+    model_takes_input_path = generator.accepts_input_path(model) if hasattr(generator, 'accepts_input_path') else False
     @tool
     def generate_image_with_context(
         prompt: str = Field(description="Detailed description of the image to generate"),
@@ -185,153 +420,117 @@ def create_generate_image_with_context(session_id: str, canvas_id: str, image_mo
         Returns:
             A message indicating successful image generation with file details
         """
-        print("🎨️ generate_image_with_context tool called!")
-        print(f"🔍 DEBUG: Using provided context - session_id: {session_id}, canvas_id: {canvas_id}")
-        print(f"🔍 DEBUG: Using provided image_model: {image_model}")
+        if generator is None:
+            # 创建工具时就已确定，不在这里抛出再捕获
+            return f"Failed to generate image: Unsupported provider: {provider}"
+        logger.debug("generate_image_with_context session_id=%s canvas_id=%s", session_id, canvas_id)
         
         try:
             # 使用提供的上下文信息而不是从contextvars获取
             tool_call_id = generate_file_id()
             
-            model = image_model.get('model', 'flux-kontext')
-            provider = image_model.get('provider', 'comfyui')
-            
-            print(f"🔍 DEBUG: model={model}, provider={provider}")
-            
-            # Get provider instance
-            generator = PROVIDERS.get(provider)
-            if not generator:
-                raise ValueError(f"Unsupported provider: {provider}")
+            logger.debug("model=%s provider=%s", model, provider)
             
             # Handle input_image parameter
             if not isinstance(input_image, str):
                 input_image = ""
 
+            # 需要从磁盘读取的输入图片路径，在生成协程中读取
+            input_image_path = None
+
             # Handle use_previous_image parameter
-            if use_previous_image and not input_image:
-                print(f"� Using previous image from session")
+            if use_previous_image and not input_image and model_uses_input_image:
+                logger.debug("Using previous image from session %s", session_id)
                 try:
                     # Get the most recent image from the current session
                     previous_image_id = get_most_recent_image_from_session(session_id)
                     if previous_image_id:
-                        # Convert the file to base64
+                        # Resolve the previous image file path
                         try:
-                            # 首先尝试从数据库获取文件信息
-                            file_record = None
-                            file_id_without_ext = previous_image_id.split('.')[0] if '.' in previous_image_id else previous_image_id
-                            try:
-                                file_record = db_service.get_file(file_id_without_ext)
-                            except Exception as db_error:
-                                pass  # 静默处理数据库查找错误
-
-                            file_path = None
-                            if file_record:
-                                # 使用数据库中的文件路径
-                                file_path = os.path.join(FILES_DIR, file_record['file_path'])
+                            file_path = resolve_image_file_path(previous_image_id)
+                            if file_path:
+                                # 文件内容在生成协程中异步读取
+                                input_image_path = file_path
+                                logger.debug("Previous image found: %s", file_path)
                             else:
-                                # 尝试直接路径
-                                file_path = os.path.join(FILES_DIR, previous_image_id)
-
-                                # 如果文件不存在且没有扩展名，尝试常见扩展名
-                                if not os.path.exists(file_path) and '.' not in previous_image_id:
-                                    for ext in ['png', 'jpg', 'jpeg', 'gif', 'webp']:
-                                        test_path = os.path.join(FILES_DIR, f'{previous_image_id}.{ext}')
-                                        if os.path.exists(test_path):
-                                            file_path = test_path
-                                            break
-
-                            if file_path and os.path.exists(file_path):
-                                with open(file_path, 'rb') as f:
-                                    image_data = f.read()
-                                    input_image = base64.b64encode(image_data).decode('utf-8')
-                                    print(f"✅ Previous image loaded successfully")
-                            else:
-                                print(f"❌ Previous image file not found")
+                                logger.warning("Previous image file not found: %s", previous_image_id)
                                 return "I found a reference to a previous image in this conversation, but the image file is no longer available. Please upload a new image that I can help you edit."
                         except Exception as file_error:
-                            print(f"❌ Error reading previous image file: {file_error}")
+                            logger.warning("Error reading previous image file: %s", file_error)
                             return "I found a previous image in this conversation, but I encountered an error while trying to access it. Please upload a new image that I can help you edit."
                     else:
                         # 当没有找到图像时，返回友好的错误信息
                         return "I don't see any previous images in this conversation that I can edit or modify. Please upload an image first, or create a new image that I can then help you edit."
                 except Exception as e:
-                    print(f"❌ Error getting previous image: {e}")
+                    logger.warning("Error getting previous image: %s", e)
                     return "I encountered an error while trying to access previous images in this conversation. Please upload an image or try again."
 
-            print(f"🎨 Generating image: {model}")
+            logger.info("Generating image with %s/%s", provider, model)
 
             # Process input_image if provided
+            # 上一张图片只会设置 input_image_path，不会写回 input_image，不存在重复编码的问题
             processed_input_image = None
-            if input_image and input_image.strip():
-
-                # Check if it's already base64 (from use_previous_image processing)
-                if use_previous_image and len(input_image) > 100 and not input_image.startswith('im_'):
-                    # It's already base64 encoded from previous image processing
-                    processed_input_image = input_image
-                # Check if input_image is a file ID (like 'im_mzp-QKbW.jpeg')
-                elif input_image.startswith('im_') and ('.' in input_image):
-                    # It's a file ID, need to convert to base64
+            input_kind = 'empty'
+            if model_uses_input_image and input_image_path is None:
+                input_image = input_image.strip()
+                input_kind = _classify_input_image(input_image)
+
+            if input_kind == 'file_id':
+                # 文件在生成协程中读取（或直接把路径交给生成器）
+                input_image_path = resolve_image_file_path(input_image)
+                if not input_image_path:
+                    logger.warning("Input image file not found: %s", input_image)
+                    return f"Failed to generate image: input image file not found: {input_image}. Please check the image ID or upload the image again."
+            elif input_kind == 'data_url':
+                # It's already a data URL, extract base64 part
+                processed_input_image = input_image.split(',', 1)[1] if ',' in input_image else input_image
+            elif input_kind == 'base64':
+                processed_input_image = _normalize_base64(input_image)
+                if processed_input_image is None:
+                    logger.warning("input_image is neither a file ID, a data URL nor valid base64")
+                    return "Failed to generate image: input_image is not an image ID, a data URL or valid base64 data. Please pass the image ID (e.g. 'im_xxx.png') or upload the image again."
+
+            async def _generate():
+                image_input = processed_input_image
+                input_is_path = bool(input_image_path and model_takes_input_path)
+                if input_is_path:
+                    # 生成器自己读取文件（如 OpenAI images.edit），跳过读取 + base64 编码
+                    image_input = input_image_path
+                elif input_image_path:
+                    # 直接打开文件，不存在时再处理，避免 exists + open 两次系统调用
                     try:
-                        file_path = os.path.join(FILES_DIR, input_image)
-
-                        # Ensure the files directory exists
-                        os.makedirs(FILES_DIR, exist_ok=True)
-
-                        if os.path.exists(file_path):
-                            with open(file_path, 'rb') as f:
-                                image_data = f.read()
-                                processed_input_image = base64.b64encode(image_data).decode('utf-8')
-                        else:
-                            print(f"❌ Input image file not found: {file_path}")
-                            processed_input_image = None
-                    except Exception as e:
-                        print(f"❌ Error reading input image file: {e}")
-                        processed_input_image = None
-                elif input_image.startswith('data:'):
-                    # It's already a data URL, extract base64 part
-                    processed_input_image = input_image.split(',')[1] if ',' in input_image else input_image
-                else:
-                    # Assume it's already base64 encoded
-                    processed_input_image = input_image
-
-            # Generate image using async generator (必须保持异步)
-            try:
-                file_id, width, height, file_path = run_async_safe(generator.generate(
+                        image_input = await read_file_base64(input_image_path)
+                    except FileNotFoundError:
+                        forget_image_file_paths()
+                        raise Exception(f"Input image file is no longer available: {os.path.basename(input_image_path)}")
+                return await generator.generate(
                     prompt=prompt,
                     model=model,
                     aspect_ratio=aspect_ratio,
-                    input_image=processed_input_image,
+                    input_image=image_input,
+                    input_is_path=input_is_path,
                     ctx={'session_id': session_id, 'tool_call_id': tool_call_id}
-                ))
-            except Exception as e:
-                print(f"❌ Image generation error: {e}")
-                raise e
+                )
 
-            print(f"✅ Generated image: {file_id} ({width}x{height})")
+            # Generate image using async generator (必须保持异步)，失败时由外层 logger.exception 记录
+            file_id, width, height, file_path = run_async_safe(_generate())
 
-            # Save to database using synchronous operations
-            try:
-                # 保存文件记录
-                db_service.create_file(file_id, file_path, width, height)
+            logger.info("Generated image: %s (%sx%s)", file_id, width, height)
 
-                # 保存图像消息和广播websocket
+            async def _save_and_broadcast():
+                # 文件记录和图像消息互不依赖，两次数据库写入并发执行
+                writes = [asyncio.to_thread(db_service.create_file, file_id, file_path, width, height)]
                 if session_id:
-                    # Create image message for database
-                    image_message = {
-                        'role': 'assistant',
-                        'content': [
-                            {
-                                'type': 'image_url',
-                                'image_url': {
-                                    'url': f'/api/file/{file_id}'
-                                }
-                            }
-                        ]
-                    }
+                    writes.append(asyncio.to_thread(
+                        db_service.create_message, session_id, 'assistant', IMAGE_MESSAGE_TEMPLATE % file_id))
+                await asyncio.gather(*writes)
+                remember_image_file_path(file_id, file_path)
 
-                    db_service.create_message(session_id, 'assistant', json.dumps(image_message))
+                if session_id:
+                    # 新生成的图像就是该会话最近的图像
+                    _recent_image_cache.pop(session_id, None)
 
-                    # Broadcast file_generated event to websocket
+                    # 消息落库之后再广播，前端收到事件后刷新能读到这条消息
                     message_data = {
                         'type': 'file_generated',
                         'file_id': file_id,
@@ -340,20 +539,19 @@ def create_generate_image_with_context(session_id: str, canvas_id: str, image_mo
                         'height': height,
                         'tool_call_id': tool_call_id
                     }
-                    print(f"🔍 DEBUG: Broadcasting file_generated message: {message_data}")
-                    run_async_safe(broadcast_session_update(session_id, canvas_id, message_data))
-                    print(f"🔍 DEBUG: Successfully broadcasted file_generated message for session {session_id}")
-
-            except Exception as db_error:
-                print(f"🔍 DEBUG: Database save error: {db_error}")
-                import traceback
-                traceback.print_exc()
+                    await broadcast_session_update(session_id, canvas_id, message_data)
+                    logger.debug("Broadcasted file_generated %s for session %s", file_id, session_id)
+
+            # 保存和广播在后台循环上一次完成
+            try:
+                run_async_safe(_save_and_broadcast())
+            except Exception:
+                logger.exception("Failed to save generated image %s for session %s", file_id, session_id)
             
             return f"Image generated successfully! File ID: {file_id}, Size: {width}x{height}. The image has been saved and is ready for use."
             
         except Exception as e:
-            print(f"Error generating image: {e}")
-            traceback.print_exc()
+            logger.exception("Error generating image")
             return f"Failed to generate image: {str(e)}"
     
     return generate_image_with_context
@@ -2,7 +2,7 @@
 Strands专门化Agent工具
 实现"Agents as Tools"模式，每个专门的agent作为工具被主agent调用
 """
-import traceback
+import logging
 from strands import Agent, tool
 try:
     from strands.models import BedrockModel
@@ -10,6 +10,8 @@ except ImportError:
     BedrockModel = None
 from pydantic import Field
 
+logger = logging.getLogger(__name__)
+
 # generate_image 导入已移除 - 主Agent直接使用generate_image_with_context
 
 
@@ -37,14 +39,22 @@ Format your plans in a clear, organized manner that is easy to follow and implem
 # COORDINATOR_SYSTEM_PROMPT removed - coordination is now handled by the main agent
 
 
+# BedrockModel 不保存请求状态，创建一次后复用，避免每次规划都初始化 boto3 客户端
+_default_model = None
+
+
 def create_default_model():
-    """创建默认的Bedrock模型实例"""
+    """创建默认的Bedrock模型实例（只缓存创建成功的实例，失败时下次调用会重试）"""
+    global _default_model
+    if _default_model is not None:
+        return _default_model
     if BedrockModel:
         try:
-            return BedrockModel(
+            _default_model = BedrockModel(
                 model_id="us.anthropic.claude-3-7-sonnet-20250219-v1:0",
                 region_name="us-west-2"
             )
+            return _default_model
         except Exception as e:
             print(f"⚠️ Failed to create BedrockModel: {e}")
             return None
@@ -61,20 +71,19 @@ def planner_agent(task: str = Field(..., description="The task or project that n
     """
     try:
         print("🎯 Routing to Planner Agent")
-        print(f"🔍 DEBUG: Planning task: {task}")
+        logger.debug("Planning task: %s", task)
 
         # 创建规划专家agent
         model = create_default_model()
         if not model:
             return "❌ Failed to create model for planner"
 
-        print(f"🔍 DEBUG: Created planner model: {model}")
+        logger.debug("Using planner model: %s", model)
 
         planner = Agent(
             model=model,
             system_prompt=PLANNER_SYSTEM_PROMPT,
         )
-        print(f"🔍 DEBUG: Created planner agent with no additional tools")
 
         formatted_task = f"""
 Please create a detailed execution plan for the following task: {task}
@@ -89,13 +98,10 @@ Provide a comprehensive plan that includes:
 
 Consider what specialists might be needed for each step and provide actionable guidance that can be easily followed and implemented.
 """
-        print(f"🔍 DEBUG: Formatted planning task: {formatted_task}")
-
-        print("🔍 DEBUG: Calling planner agent with streaming...")
+        logger.debug("Formatted planning task: %s", formatted_task)
 
         # 使用同步调用替代流式调用
         try:
-            print("🔍 DEBUG: Calling planner with synchronous call...")
             response = planner(formatted_task)
 
             if hasattr(response, 'content'):
@@ -106,16 +112,14 @@ Consider what specialists might be needed for each step and provide actionable g
                 response_text = str(response)
 
         except Exception as e:
-            print(f"🔍 DEBUG: Planner synchronous call error: {e}")
-            print(f"🔍 DEBUG: Planner error traceback: {traceback.format_exc()}")
+            logger.exception("Planner call failed")
             response_text = f"❌ Planning Error: {str(e)}"
 
-        print(f"🔍 DEBUG: Planner response: {response_text}")
+        logger.debug("Planner response: %s", response_text)
         return f"📋 Planning Complete:\n{response_text}"
 
     except Exception as e:
-        print(f"🔍 DEBUG: Planning Error: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Planning failed")
         return f"❌ Planning Error: {str(e)}"
 
 
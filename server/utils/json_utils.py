@@ -0,0 +1,24 @@
+"""
+JSON 编解码
+
+优先使用 orjson（更快、更少中间对象），未安装时回退到标准库 json。
+dumps 始终返回 str，可直接写入数据库。
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+
+    def loads(data: Any) -> Any:
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+except ImportError:
+    def loads(data: Any) -> Any:
+        return json.loads(data)
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj)
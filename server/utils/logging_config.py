@@ -0,0 +1,47 @@
+"""
+日志配置
+
+应用日志通过 QueueHandler 进入队列，由后台 QueueListener 线程负责格式化和写 stderr，
+调用方（包括事件循环上的协程）只做一次入队操作，不会被控制台 I/O 阻塞。
+"""
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+_listener: Optional[QueueListener] = None
+
+# 应用自己的 logger（按 __name__ 命名）所在的顶层包；LOG_LEVEL 只作用于这些包，
+# 第三方库（httpx、botocore、strands 等）仍沿用 root 的 WARNING，不会刷出每次请求的 INFO 日志
+APP_LOGGER_PREFIXES = ('tools', 'services', 'routers', 'utils')
+
+
+def start_queue_logging(level: Optional[str] = None) -> None:
+    """给 root logger 挂上 QueueHandler 并启动后台监听线程，重复调用无副作用"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(logging.WARNING)
+    app_level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    for prefix in APP_LOGGER_PREFIXES:
+        logging.getLogger(prefix).setLevel(app_level)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_queue_logging() -> None:
+    """停止监听线程，并把队列中剩余的日志写完"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None